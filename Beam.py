@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 import numpy
 from Beamlet import BeamletHBA, BeamletLBA
+from Config import Validate
+from Errors import InvalidSubbandError
+from Station import Default_station
 
 
 
@@ -14,9 +17,13 @@ class Beam(object):
     list of beamlets.
     
     Methods:
-        __init__(bids, subbands, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000")
+        __init__(bids, subbands, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000", anara=None, anadec=None, station=None)
     
     Properties:
+        anadec (float): Declination in radians of the HBA analogue beam
+            former (or elevation analogue in other coordinate system).
+        anara (float): Right ascension in radians of the HBA analogue beam
+            former (or azimuth analogue in other coordinate system).
         antennaset (str): Antenna set selection.
         beamctl (str): Telescope control sequence string for each beamlet
             contained in the beam.
@@ -26,6 +33,7 @@ class Beam(object):
         dec (float): Declination in radians (or elevation analogue in other
             coordinate system).
         nbeamlets (int): Number of beamlets formed.
+        ncommands (int): Number of telescope control sequences.
         ra (float): Right ascension in radians (or azimuth analogue in other
             coordinate system).
         rcumode (int): Receiver mode selection.
@@ -35,8 +43,8 @@ class Beam(object):
         See LofarCtl_config.json for the list of possible antennaset, coordsys and
         rcumode.
     """
-    def __init__(self, bids, subbands, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000"):
-        """__init__(bids, subbands, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000")
+    def __init__(self, bids, subbands, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000", anara=None, anadec=None, station=None):
+        """__init__(bids, subbands, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000", anara=None, anadec=None, station=None)
         
         bids (list[int]): List of unique beamlet IDs.
         subbands (list[int]): List of subbands. Each subband forms a beamlet.
@@ -48,14 +56,28 @@ class Beam(object):
         rcumode (int): Receiver mode selection.
             See Table 7 of Station Data Cookbook.
         coordsys (str): Coordinate system.
+        anara (float): Right ascension in radians of the HBA analogue beam
+            former (or azimuth analogue in other coordinate system).
+            If None, the beam center is used.
+        anadec (float): Declination in radians of the HBA analogue beam
+            former (or elevation analogue in other coordinate system).
+            If None, the beam center is used.
+        station (Station): Station model providing the number of subbands
+            and receiver units. If None, the station of the configuration
+            is used.
 
         See LofarCtl_config.json for the list of possible antennaset, coordsys and
         rcumode.
         """
-        if numpy.min(subbands) < 0 or numpy.max(subbands) > 511:
-            raise RuntimeError( "The subbands do not fit within the allowed range (0-511)" )
+        # Check the antenna set, receiver mode and coordinate system once for all the beamlets
+        antennaset = Validate(antennaset, rcumode, coordsys)
+        if station is None:
+            station = Default_station()
+        self._station = station
+        if numpy.min(subbands) < 0 or numpy.max(subbands) > station.nsubbands-1:
+            raise InvalidSubbandError( "The subbands do not fit within the allowed range (0-{0})".format(station.nsubbands-1) )
         if len(bids) != len(subbands):
-            raise RuntimeError( "Number of bids ({0}) does not match the number of subbands ({1})".format(len(bids), len(subbands)) )
+            raise InvalidSubbandError( "Number of bids ({0}) does not match the number of subbands ({1})".format(len(bids), len(subbands)) )
         self._bids = numpy.array(bids)
         self._subbands = numpy.array(subbands)
         self._nbeamlets = len(self._subbands)
@@ -66,18 +88,33 @@ class Beam(object):
             sep_subbands = self._subbands[1:] - self._subbands[:-1]
             if (sep_bids == 1).all() and (sep_subbands == 1).all():
                 self._contiguous = True
-        self._beamlets = []
+        self._beamlets = None
         self._ra = ra
         self._dec = dec
-        self._antennaset = antennaset.upper()
+        self._anara = ra if anara is None else anara
+        self._anadec = dec if anadec is None else anadec
+        self._antennaset = antennaset
         self._rcumode = rcumode
         self._coordsys = coordsys
-        self._lofar_HBA = 1 if self._antennaset.find('HBA') >= 0 else 1
-        self._Make_beam()
+        self._lofar_HBA = 1 if self._antennaset.find('HBA') >= 0 else 0
 
     def __str__(self):
         return self.beamctl
 
+    @property
+    def anadec(self):
+        """anadec (float): Declination in radians of the HBA analogue beam
+            former (or elevation analogue in other coordinate system).
+        """
+        return self._anadec
+
+    @property
+    def anara(self):
+        """anara (float): Right ascension in radians of the HBA analogue beam
+            former (or azimuth analogue in other coordinate system).
+        """
+        return self._anara
+
     @property
     def antennaset(self):
         """antennaset (str): Antenna set selection.
@@ -89,12 +126,16 @@ class Beam(object):
         """beamctl (str): Telescope control sequence string for each beamlet
             contained in the beam.
         """
-        return "\n".join( beamlet.beamletctl for beamlet in self._beamlets )
+        return "\n".join( self._Render() )
 
     @property
     def beamlets(self):
         """beamlets (list[Beamlet]): List of Beamlet objects contained in the beam.
         """
+        # The beamlets are only needed for inspection, so they are created on first access
+        if self._beamlets is None:
+            self._beamlets = []
+            self._Make_beam()
         return self._beamlets
 
     @property
@@ -122,6 +163,12 @@ class Beam(object):
         """
         return self._nbeamlets
 
+    @property
+    def ncommands(self):
+        """ncommands (int): Number of telescope control sequences.
+        """
+        return 1 if self._contiguous else self._nbeamlets
+
     @property
     def ra(self):
         """ra (float): Right ascension in radians (or azimuth analogue in other
@@ -150,14 +197,34 @@ class Beam(object):
         ### In the case of contiguous beamlets we merge them into a single telescope call
         if self._contiguous:
             if self._lofar_HBA == 1:
-                self._beamlets.append( BeamletHBA(self._ra, self._dec, self._bids[[0,-1]], self._subbands[[0,-1]], self._ra, self._dec, antennaset=self._antennaset, rcumode=self._rcumode, coordsys=self._coordsys) )
+                self._beamlets.append( BeamletHBA(self._anara, self._anadec, self._bids[[0,-1]], self._subbands[[0,-1]], self._ra, self._dec, antennaset=self._antennaset, rcumode=self._rcumode, coordsys=self._coordsys, station=self._station) )
             else:
-                self._beamlets.append( BeamletLBA(self._bids[[0,-1]], self._subbands[[0,-1]], self._ra, self._dec, antennaset=self._antennaset, rcumode=self._rcumode, coordsys=self._coordsys) )
+                self._beamlets.append( BeamletLBA(self._bids[[0,-1]], self._subbands[[0,-1]], self._ra, self._dec, antennaset=self._antennaset, rcumode=self._rcumode, coordsys=self._coordsys, station=self._station) )
         else:
             for bid, subband in zip(self._bids, self._subbands):
                 if self._lofar_HBA == 1:
-                    self._beamlets.append( BeamletHBA(self._ra, self._dec, bid, subband, self._ra, self._dec, antennaset=self._antennaset, rcumode=self._rcumode, coordsys=self._coordsys) )
+                    self._beamlets.append( BeamletHBA(self._anara, self._anadec, bid, subband, self._ra, self._dec, antennaset=self._antennaset, rcumode=self._rcumode, coordsys=self._coordsys, station=self._station) )
                 else:
-                    self._beamlets.append( BeamletLBA(bid, subband, self._ra, self._dec, antennaset=self._antennaset, rcumode=self._rcumode, coordsys=self._coordsys) )
+                    self._beamlets.append( BeamletLBA(bid, subband, self._ra, self._dec, antennaset=self._antennaset, rcumode=self._rcumode, coordsys=self._coordsys, station=self._station) )
+
+    def _Render(self):
+        """_Render()
+        Returns the list of telescope control sequences of the beam. The
+        sequences are formatted all at once from the arrays of beamlet IDs
+        and subbands, and are identical to the beamletctl of the beamlets.
+        """
+        # The options shared by all the beamlets of the beam are formatted only once
+        head = "beamctl --antennaset={0} --rcus={1} --rcumode={2} --subbands=".format(self._antennaset, self._station.rcus, self._rcumode)
+        tail = " --digdir={0},{1},{2}".format(self._ra, self._dec, self._coordsys)
+        if self._lofar_HBA == 1:
+            tail += " --anadir={0},{1},{2}".format(self._anara, self._anadec, self._coordsys)
+        tail += " &"
+        if self._contiguous:
+            return [ "{0}{1}:{2} --beamlets={3}:{4}{5}".format(head, self._subbands[0], self._subbands[-1], self._bids[0], self._bids[-1], tail) ]
+        ctl = numpy.char.add(head, self._subbands.astype(str))
+        ctl = numpy.char.add(ctl, " --beamlets=")
+        ctl = numpy.char.add(ctl, self._bids.astype(str))
+        ctl = numpy.char.add(ctl, tail)
+        return ctl.tolist()
 
 
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 import numpy
-from LofarCtl.Config import config
+from Config import Validate
+from Station import Default_station
 
 
 ##### ##### #####
@@ -14,7 +15,7 @@ class _Beamlet(object):
     at a LOFAR station. Each of them represents one subband.
     
     Methods:
-        __init__(bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000")
+        __init__(bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000", station=None)
     
     Properties:
         antennaset (str): Antenna set selection.
@@ -33,8 +34,8 @@ class _Beamlet(object):
         See LofarCtl_config.json for the list of possible antennaset, coordsys and
         rcumode.
     """
-    def __init__(self, bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000"):
-        """__init__(bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000")
+    def __init__(self, bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000", station=None):
+        """__init__(bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000", station=None)
 
         bid (int): Unique beamlet ID. (0...243)
         subband (int): Subband number. (0...511)
@@ -46,43 +47,23 @@ class _Beamlet(object):
         rcumode (int): Receiver mode selection.
             See Table 7 of Station Data Cookbook.
         coordsys (str): Coordinate system.
+        station (Station): Station model providing the receiver units. If
+            None, the station of the configuration is used.
 
         See LofarCtl_config.json for the list of possible antennaset, coordsys and
         rcumode.
         """
-        # The list of defined antenna sets
-        _antennaset = config["antennaset"]
-        # The list of available rcu modes
-        _rcumode = config["rcumode"]
-        # The list of available coordinate systems
-        _coordsys = config["coordsys"]
-
+        if station is None:
+            station = Default_station()
+        self._rcus = station.rcus
         self._bid = bid
         self._subband = subband
         self._ra = ra
         self._dec = dec
-        # Check that the antenna set is valid
-        if antennaset.upper() in _antennaset:
-            self._antennaset = antennaset.upper()
-        else:
-            raise RuntimeError( "The requested antenna set ({0}) does not match any of the available antenna sets.".format(antennaset.upper()) )
-        # Check that the receiver mode is valid
-        if rcumode in _rcumode:
-            self._rcumode = rcumode
-        else:
-            raise RuntimeError( "The requested rcu mode ({0}) does not match any of the possible rcu modes.".format(rcumode) )
-        # Check that the coordinate system is valid
-        if coordsys in _coordsys:
-            self._coordsys = coordsys
-        else:
-            raise RuntimeError( "The requested coordinate system ({0}) does not match any of the possible coordinate system.".format(coordsys) )
-        # Check that the antenna set and receiver mode are compatible
-        if self._antennaset.find('HBA') != -1 and self._rcumode in [5,6,7]:
-            pass
-        elif  self._antennaset.find('LBA') != -1 and self._rcumode in [3,4]:
-            pass
-        else:
-            raise RuntimeError( "The antenna set ({0}) is not compatible with the receiver mode ({1})".format(self._antennaset, self._rcumode) )
+        # Check that the antenna set, receiver mode and coordinate system are valid and compatible
+        self._antennaset = Validate(antennaset, rcumode, coordsys)
+        self._rcumode = rcumode
+        self._coordsys = coordsys
 
     def __str__(self):
         return self.beamletctl
@@ -146,9 +127,9 @@ class _Beamlet(object):
         sequence.
         """
         if isinstance(self._bid, (list, numpy.ndarray, tuple)):
-            ctl = "--antennaset={0} --rcus=0:191 --rcumode={1} --subbands={2[0]}:{2[1]} --beamlets={3[0]}:{3[1]} --digdir={4},{5},{6}".format(self._antennaset, self._rcumode, self._subband, self._bid, self._ra, self._dec, self._coordsys)
+            ctl = "--antennaset={0} --rcus={7} --rcumode={1} --subbands={2[0]}:{2[1]} --beamlets={3[0]}:{3[1]} --digdir={4},{5},{6}".format(self._antennaset, self._rcumode, self._subband, self._bid, self._ra, self._dec, self._coordsys, self._rcus)
         else:
-            ctl = "--antennaset={0} --rcus=0:191 --rcumode={1} --subbands={2} --beamlets={3} --digdir={4},{5},{6}".format(self._antennaset, self._rcumode, self._subband, self._bid, self._ra, self._dec, self._coordsys)
+            ctl = "--antennaset={0} --rcus={7} --rcumode={1} --subbands={2} --beamlets={3} --digdir={4},{5},{6}".format(self._antennaset, self._rcumode, self._subband, self._bid, self._ra, self._dec, self._coordsys, self._rcus)
         return ctl
 
 
@@ -164,7 +145,7 @@ class BeamletLBA(_Beamlet):
     at a LOFAR station. Each of them represents one subband.
     
     Methods:
-        __init__(bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000")
+        __init__(bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000", station=None)
     
     Properties:
         antennaset (str): Antenna set selection.
@@ -184,7 +165,7 @@ class BeamletLBA(_Beamlet):
         rcumode.
     """
     def __init__(self, *args, **kwargs):
-        """__init__(bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000")
+        """__init__(bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000", station=None)
 
         bid (int): Unique beamlet ID. (0...243)
         subband (int): Subband number. (0...511)
@@ -196,6 +177,8 @@ class BeamletLBA(_Beamlet):
         rcumode (int): Receiver mode selection.
             See Table 7 of Station Data Cookbook.
         coordsys (str): Coordinate system.
+        station (Station): Station model providing the receiver units. If
+            None, the station of the configuration is used.
 
         See LofarCtl_config.json for the list of possible antennaset, coordsys and
         rcumode.
@@ -215,7 +198,7 @@ class BeamletHBA(_Beamlet):
     at a LOFAR station. Each of them represents one subband.
     
     Methods:
-        __init__(anara, anadec, bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000")
+        __init__(anara, anadec, bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000", station=None)
     
     Properties:
         anadec (float): Declination in radians of the HBA analogue beam
@@ -239,7 +222,7 @@ class BeamletHBA(_Beamlet):
         rcumode.
     """
     def __init__(self, anara, anadec, *args, **kwargs):
-        """__init__(anara, anadec, bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000")
+        """__init__(anara, anadec, bid, subband, ra, dec, antennaset="HBA_DUAL", rcumode=5, coordsys="J2000", station=None)
 
         anara (float): Right ascension in radians of the HBA analogue beam
             former (or azimuth analogue in other coordinate system).
@@ -255,6 +238,8 @@ class BeamletHBA(_Beamlet):
         rcumode (int): Receiver mode selection.
             See Table 7 of Station Data Cookbook.
         coordsys (str): Coordinate system.
+        station (Station): Station model providing the receiver units. If
+            None, the station of the configuration is used.
 
         See LofarCtl_config.json for the list of possible antennaset, coordsys and
         rcumode.
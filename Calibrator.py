@@ -1,8 +1,11 @@
 #!/usr/bin/env python
+import hashlib
 import numpy
 from astropysics.coords.coordsys import FK5Coordinates
-from LofarCtl import Config
+import Config
+import Ephemeris
 import json
+import os
 
 
 ##### ##### #####
@@ -16,11 +19,14 @@ class Calibrator(object):
         __init__(fln=None)
         Elevation(observatory, time_up)
         Separation(*args)
+        Visibility(observatory, date_start, date_end=None, elevation=30.,
+            cache=True)
+        Visible(observatory, time_start, time_end, elevation=30.)
     
     Properties:
         names (list[str]): List of calibrator names
-        ra (list[float]): List of calibrator right ascenscion (in degrees)
-        dec (list[float]): List of calibrator right declination (in degrees)
+        ra (array[float]): Calibrator right ascensions (in radians)
+        dec (array[float]): Calibrator declinations (in radians)
         source (list[FK5Coordinates]): List of calibrator FK5Coordinates
             objects.
         nsources (int): Number of calibrators.
@@ -43,6 +49,21 @@ class Calibrator(object):
             self.names.append( name )
             self.coords.append( FK5Coordinates(source["ra"], source["dec"], source["epoch"]) )
         self.nsources = len(self.names)
+        # Coordinates in radians for the vectorized calculations
+        self._ra = numpy.array([s.ra.radians for s in self.coords])
+        self._dec = numpy.array([s.dec.radians for s in self.coords])
+
+    @property
+    def dec(self):
+        """dec (array[float]): Calibrator declinations (in radians)
+        """
+        return self._dec
+
+    @property
+    def ra(self):
+        """ra (array[float]): Calibrator right ascensions (in radians)
+        """
+        return self._ra
 
     def Elevation(self, observatory, time_up):
         """Elevation(observatory, time_up)
@@ -88,7 +109,102 @@ class Calibrator(object):
             distance[i] = (s-source).degrees
         return distance        
 
+    def Visibility(self, observatory, date_start, date_end=None, elevation=30., cache=True):
+        """Visibility(observatory, date_start, date_end=None, elevation=30., cache=True)
+        Returns the rise, set and transit times of the calibrators above an
+        elevation limit for each day of a date range. The times are
+        returned as Modified Julian Dates (UTC) in arrays of shape
+        (ndays, nsources), for the transit occurring during each day.
+        Calibrators that never rise have NaN rise and set times, and those
+        that never set have -inf and +inf respectively.
+        The results are cached on disk for each site, date and elevation
+        limit, so that repeated queries do not recompute them. Cached
+        results are discarded if the names or coordinates of the
+        calibrators have changed.
+        
+        observatory (Site, tuple): An observatory instance (from
+            astropysics.obstools.site), or a tuple of (latitude, longitude)
+            in degrees, longitude east positive.
+        date_start (date): First day (UTC).
+        date_end (date): Last day (UTC), included. If None, only date_start
+            is computed.
+        elevation (float): Elevation limit in degrees.
+        cache (bool): If True, the on-disk cache is used.
+        
+        Note:
+            The coordinates are not precessed and refraction is neglected,
+            which is accurate to a few minutes of time.
+        """
+        latitude, longitude = Ephemeris.Site_coordinates(observatory)
+        day_start = int(numpy.floor(Ephemeris.Mjd_from_datetime(date_start)))
+        if date_end is None:
+            day_end = day_start
+        else:
+            day_end = int(numpy.floor(Ephemeris.Mjd_from_datetime(date_end)))
+        days = numpy.arange(day_start, day_end+1)
+        rise = numpy.empty((days.size, self.nsources))
+        sets = numpy.empty((days.size, self.nsources))
+        transit = numpy.empty((days.size, self.nsources))
+        # Loading the days already in the cache
+        missing = numpy.ones(days.size, dtype=bool)
+        if cache:
+            sources = self._Sources_digest()
+            for i, day in enumerate(days):
+                fln = self._Visibility_cache_file(latitude, longitude, day, elevation)
+                if os.path.exists(fln):
+                    with numpy.load(fln) as data:
+                        if 'sources' in data.files and str(data['sources']) == sources:
+                            rise[i], sets[i], transit[i] = data['rise'], data['set'], data['transit']
+                            missing[i] = False
+        # Computing all the missing days at once
+        if missing.any():
+            rise[missing], sets[missing], transit[missing] = Ephemeris.Visibility_windows(self._ra, self._dec, latitude, longitude, days[missing], numpy.radians(elevation))
+            if cache:
+                if not os.path.exists(Config.cache_path):
+                    os.makedirs(Config.cache_path)
+                for i in numpy.flatnonzero(missing):
+                    fln = self._Visibility_cache_file(latitude, longitude, days[i], elevation)
+                    numpy.savez(fln, names=numpy.array(self.names), sources=numpy.array(sources), rise=rise[i], set=sets[i], transit=transit[i])
+        return rise, sets, transit
+
+    def Visible(self, observatory, time_start, time_end, elevation=30.):
+        """Visible(observatory, time_start, time_end, elevation=30.)
+        Returns the names of the calibrators that stay above an elevation
+        limit during the whole time interval.
+        
+        observatory (Site, tuple): An observatory instance (from
+            astropysics.obstools.site), or a tuple of (latitude, longitude)
+            in degrees, longitude east positive.
+        time_start (datetime): Start of the interval (UTC).
+        time_end (datetime): End of the interval (UTC).
+        elevation (float): Elevation limit in degrees.
+        """
+        mjd_start = Ephemeris.Mjd_from_datetime(time_start)
+        mjd_end = Ephemeris.Mjd_from_datetime(time_end)
+        # The windows are indexed by the day of their transit, and the transit
+        # of a window containing the interval is less than a day from its start
+        rise, sets, transit = self.Visibility(observatory, Ephemeris.Datetime_from_mjd(mjd_start-1), Ephemeris.Datetime_from_mjd(max(mjd_end, mjd_start+1)), elevation=elevation)
+        visible = ((rise <= mjd_start) & (sets >= mjd_end)).any(axis=0)
+        return [ name for name, flag in zip(self.names, visible) if flag ]
 
+    def _Sources_digest(self):
+        """_Sources_digest()
+        Returns a digest of the names and coordinates of the calibrators,
+        which identifies the list of calibrators of a cache file.
+        """
+        data = "\n".join(self.names).encode('utf-8') + self._ra.astype('<f8').tobytes() + self._dec.astype('<f8').tobytes()
+        return hashlib.sha1(data).hexdigest()
 
+    def _Visibility_cache_file(self, latitude, longitude, day, elevation):
+        """_Visibility_cache_file(latitude, longitude, day, elevation)
+        Returns the name of the cache file of the visibility windows.
+        
+        latitude (float): Latitude of the site in radians.
+        longitude (float): Longitude of the site in radians.
+        day (int): Modified Julian Date of the day.
+        elevation (float): Elevation limit in degrees.
+        """
+        date = Ephemeris.Datetime_from_mjd(day)
+        return os.path.join(Config.cache_path, 'visibility_{0:+.4f}_{1:+.4f}_{2:%Y%m%d}_{3:.2f}.npz'.format(numpy.degrees(latitude), numpy.degrees(longitude), date, elevation))
 
 
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+import argparse
+import collections
+import itertools
+import json
+import os
+import re
+import sys
+import time
+
+
+def main(argv=None):
+    """main(argv=None)
+    Command line entry point. Reads a schedule file of observation
+    specifications (see Explorer.Build_observation) and writes the
+    telescope control sequence of each of them, as soon as it is built,
+    either to stdout or to one file per slot.
+    With --replay, re-runs a trace file recorded by Trace.Recorder instead
+    and prints the latency of each call and whether the outputs are
+    identical.
+
+    argv (list[str]): Command line arguments. If None, sys.argv is used.
+    """
+    parser = argparse.ArgumentParser(prog='LofarCtl', description='Generate the beamctl scripts of a schedule of observations.')
+    parser.add_argument('schedule', nargs='?', default=None, help="Schedule file, in JSON lines (one specification per line) or YAML (one specification per document, or a list). Use '-' for JSON lines from stdin.")
+    parser.add_argument('-o', '--outdir', default=None, help='Directory where to write one script per slot. Default is stdout.')
+    parser.add_argument('-p', '--pattern', default='slot_{index:04d}.sh', help="File name pattern of the scripts. Can use {index} and {name}. Default is '%(default)s'.")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of worker processes. Default is %(default)s.')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Do not print the summary to stderr.')
+    parser.add_argument('--replay', default=None, metavar='TRACE', help='Replay a trace file against the current code and print the report.')
+    args = parser.parse_args(argv)
+
+    if args.replay is not None:
+        import Trace
+        report = Trace.Replay(args.replay)
+        Trace.Print_report(report)
+        return 0 if report['obsctl_identical'] == report['obsctl_total'] and len(report['errors']) == 0 else 1
+    if args.schedule is None:
+        parser.error('a schedule file is required')
+
+    specs = _Read_schedule(args.schedule)
+    if args.outdir is not None and not os.path.exists(args.outdir):
+        os.makedirs(args.outdir)
+    nslots = 0
+    nfailed = 0
+    ncommands = 0
+    build_times = []
+    start = time.time()
+    for index, name, ctl, ncmd, build_time, error in _Build_all(specs, args.jobs):
+        # The name comes from the schedule file, it must not break the lines of the script
+        name = _Safe_name(name)
+        if error is not None:
+            sys.stderr.write("Error: slot {0} {1} could not be built: {2}\n".format(index, name, error))
+            nfailed += 1
+            continue
+        if args.outdir is None:
+            sys.stdout.write("# slot {0} {1}\n".format(index, name))
+            sys.stdout.write(ctl)
+            sys.stdout.flush()
+        else:
+            fln = os.path.join(args.outdir, args.pattern.format(index=index, name=name))
+            with open(fln, 'w') as f:
+                f.write(ctl)
+        nslots += 1
+        ncommands += ncmd
+        build_times.append(build_time)
+    if not args.quiet:
+        sys.stderr.write("Slots: {0}\n".format(nslots))
+        sys.stderr.write("Failed: {0}\n".format(nfailed))
+        sys.stderr.write("Commands: {0}\n".format(ncommands))
+        if nslots > 0:
+            sys.stderr.write("Build time: total {0:.3f} s, mean {1:.3f} s, max {2:.3f} s\n".format(sum(build_times), sum(build_times)/nslots, max(build_times)))
+        sys.stderr.write("Wall time: {0:.3f} s\n".format(time.time()-start))
+    return 1 if nfailed > 0 else 0
+
+def _Build(item):
+    """_Build(item)
+    Builds the observation of one slot and returns (index, name, obsctl,
+    ncommands, build_time, error). If the slot could not be built, obsctl
+    is None and error is the error message, otherwise error is None.
+    The messages printed while building go to stderr, so that they do not
+    end up in the scripts written to stdout.
+
+    item (tuple): Index of the slot and its specification.
+    """
+    from Explorer import Build_observation
+    index, spec = item
+    if isinstance(spec, _Parse_error):
+        return index, spec.name, None, 0, 0., str(spec)
+    name = str(spec.get('name', '')) if isinstance(spec, dict) else ''
+    t0 = time.time()
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        obs = Build_observation(spec)
+        ctl = obs.obsctl
+    except Exception as inst:
+        return index, name, None, 0, time.time() - t0, "{0}: {1}".format(type(inst).__name__, inst)
+    finally:
+        sys.stdout = stdout
+    build_time = time.time() - t0
+    ncommands = sum( beam.ncommands for beam in obs.beams )
+    return index, name, ctl, ncommands, build_time, None
+
+def _Build_all(specs, jobs):
+    """_Build_all(specs, jobs)
+    Generator building the slots in order. With several jobs, the
+    specifications are sent to a pool of workers through a bounded
+    sliding window: a new slot is submitted each time one is yielded, so
+    that the workers stay busy while only a few slots are held in memory
+    at any time.
+
+    specs (iterator[dict]): Observation specifications.
+    jobs (int): Number of worker processes.
+    """
+    items = enumerate(specs)
+    if jobs <= 1:
+        for item in items:
+            yield _Build(item)
+        return
+    import multiprocessing
+    pool = multiprocessing.Pool(jobs)
+    try:
+        pending = collections.deque( pool.apply_async(_Build, (item,)) for item in itertools.islice(items, 4*jobs) )
+        while len(pending) > 0:
+            result = pending.popleft().get()
+            # Refilling the window before yielding keeps the workers busy
+            for item in itertools.islice(items, 1):
+                pending.append( pool.apply_async(_Build, (item,)) )
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+class _Parse_error(ValueError):
+    """class _Parse_error(ValueError)
+    A specification of the schedule file that could not be parsed.
+    """
+    def __init__(self, name, message):
+        """__init__(name, message)
+
+        name (str): Name of the slot, giving its position in the file.
+        message (str): Error message.
+        """
+        ValueError.__init__(self, message)
+        self.name = name
+
+    def __reduce__(self):
+        # Needed to send the error to the worker processes
+        return (_Parse_error, (self.name, str(self)))
+
+def _Safe_name(name):
+    """_Safe_name(name)
+    Returns a version of a slot name that can be used in a file name
+    without leaving the output directory, and in a comment line of a
+    script. Characters other than letters,
+    digits, '.', '-' and '_' are replaced with '_', and leading dots are
+    removed.
+
+    name (str): Slot name.
+    """
+    return re.sub(r'[^A-Za-z0-9._-]', '_', name).lstrip('.')
+
+def _Read_schedule(fln):
+    """_Read_schedule(fln)
+    Generator yielding the observation specifications of a schedule file
+    one at a time, as they are parsed. A specification that cannot be
+    parsed is yielded as a _Parse_error giving its line number, so that it
+    is reported as a failed slot. For JSON lines, the following lines are
+    still read. A YAML stream cannot be read past a syntax error, so it
+    ends there.
+
+    fln (str): Schedule file name, or '-' for stdin.
+    """
+    if fln == '-':
+        f = sys.stdin
+    else:
+        f = open(fln)
+    try:
+        if fln.lower().endswith(('.yaml', '.yml')):
+            import yaml
+            try:
+                for document in yaml.safe_load_all(f):
+                    if isinstance(document, list):
+                        for spec in document:
+                            yield spec
+                    elif document is not None:
+                        yield document
+            except yaml.YAMLError as inst:
+                mark = getattr(inst, 'problem_mark', None)
+                lineno = mark.line+1 if mark is not None else '?'
+                yield _Parse_error("line {0}".format(lineno), "Invalid YAML at line {0}: {1}".format(lineno, inst))
+        else:
+            for lineno, line in enumerate(f, 1):
+                line = line.strip()
+                if line == '' or line.startswith('#'):
+                    continue
+                try:
+                    spec = json.loads(line)
+                except ValueError as inst:
+                    spec = _Parse_error("line {0}".format(lineno), "Invalid JSON at line {0}: {1}".format(lineno, inst))
+                yield spec
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
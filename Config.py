@@ -1,5 +1,7 @@
 import os
 import json
+import collections
+from Errors import InvalidAntennasetError, InvalidRcumodeError, InvalidCoordsysError, IncompatibleModeError
 
 
 default_config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config')
@@ -19,3 +21,80 @@ else:
 
 config = json.load(open(config_file))
 
+# Directory where precomputed results (e.g. calibrator visibility) are cached.
+# It is per user, as the configuration directory may be read-only.
+cache_path = config.get("cache_path", os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.environ['HOME'], '.cache')), 'LofarCtl'))
+
+# Station model (limits and receiver modes), for configuration files that do
+# not define it. These are the values of the current international stations.
+default_station = {
+    "nbeamlets": 244,
+    "nrcus": 192,
+    "nsubbands": 512,
+    "bitmode": 16,
+    "rcumodes": {
+        "0": {"clock": 200., "band": [0., 0.], "passband": [0., 0.]},
+        "1": {"clock": 200., "band": [0., 100.], "passband": [10., 90.]},
+        "2": {"clock": 200., "band": [0., 100.], "passband": [30., 80.]},
+        "3": {"clock": 200., "band": [0., 100.], "passband": [10., 80.]},
+        "4": {"clock": 200., "band": [0., 100.], "passband": [30., 80.]},
+        "5": {"clock": 200., "band": [100., 200.], "passband": [110., 190.]},
+        "6": {"clock": 160., "band": [160., 240.], "passband": [170., 230.]},
+        "7": {"clock": 200., "band": [200., 300.], "passband": [210., 270.]}
+    }
+}
+
+# Receiver modes usable by each antenna field, for configuration files that
+# do not define them
+default_compatibility = {"HBA": [5, 6, 7], "LBA": [3, 4]}
+
+Constraints = collections.namedtuple('Constraints', ['antennaset', 'rcumode', 'coordsys', 'compatible'])
+
+
+def Compile_constraints(config):
+    """Compile_constraints(config)
+    Returns a frozen table of the constraints defined in the configuration.
+    The allowed values are stored as sets and the compatibility between
+    antenna sets and rcu modes as a set of (antennaset, rcumode) pairs.
+
+    config (dict): Configuration, as loaded from LofarCtl_config.json.
+    """
+    antennaset = frozenset(name.upper() for name in config["antennaset"])
+    rcumode = frozenset(config["rcumode"])
+    coordsys = frozenset(config["coordsys"])
+    compatibility = config.get("compatibility", default_compatibility)
+    compatible = frozenset( (name, mode) for name in antennaset for field, modes in compatibility.items() if name.find(field) != -1 for mode in modes if mode in rcumode )
+    return Constraints(antennaset, rcumode, coordsys, compatible)
+
+constraints = Compile_constraints(config)
+
+_validated = {}
+
+def Validate(antennaset, rcumode, coordsys=None):
+    """Validate(antennaset, rcumode, coordsys=None)
+    Verifies that the antenna set, rcu mode and coordinate system are
+    defined in the configuration and compatible with each other. Returns
+    the normalized (upper case) antenna set. Successful validations are
+    cached, so repeated calls with the same parameters are cheap.
+
+    antennaset (str): Antenna set selection.
+    rcumode (int): Receiver mode selection.
+    coordsys (str): Coordinate system. If None, it is not checked.
+    """
+    key = (antennaset, rcumode, coordsys)
+    try:
+        return _validated[key]
+    except KeyError:
+        pass
+    name = antennaset.upper()
+    if name not in constraints.antennaset:
+        raise InvalidAntennasetError( "The requested antenna set ({0}) does not match any of the available antenna sets.".format(name) )
+    if rcumode not in constraints.rcumode:
+        raise InvalidRcumodeError( "The requested rcu mode ({0}) does not match any of the possible rcu modes.".format(rcumode) )
+    if coordsys is not None and coordsys not in constraints.coordsys:
+        raise InvalidCoordsysError( "The requested coordinate system ({0}) does not match any of the possible coordinate system.".format(coordsys) )
+    if (name, rcumode) not in constraints.compatible:
+        raise IncompatibleModeError( "The antenna set ({0}) is not compatible with the receiver mode ({1})".format(name, rcumode) )
+    _validated[key] = name
+    return name
+
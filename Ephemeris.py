@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+import datetime
+import numpy
+
+
+# Ratio of the sidereal to the solar rotation rate of the Earth
+sidereal_rate = 1.00273790935
+# Modified Julian Date of the 1970-01-01 epoch
+_mjd_epoch = 40587.
+_datetime_epoch = datetime.datetime(1970, 1, 1)
+
+
+def Datetime_from_mjd(mjd):
+    """Datetime_from_mjd(mjd)
+    Returns the UTC datetime.datetime corresponding to a Modified Julian
+    Date.
+
+    mjd (float): Modified Julian Date.
+    """
+    return _datetime_epoch + datetime.timedelta(days=float(mjd)-_mjd_epoch)
+
+def Elevation(ra, dec, latitude, longitude, mjd):
+    """Elevation(ra, dec, latitude, longitude, mjd)
+    Returns the elevation in radians of sources at the given times. The
+    inputs are broadcast against each other.
+
+    ra (float, array): Right ascension in radians.
+    dec (float, array): Declination in radians.
+    latitude (float): Latitude of the site in radians.
+    longitude (float): Longitude of the site in radians (east positive).
+    mjd (float, array): Modified Julian Date (UTC).
+    """
+    hour_angle = Gmst(mjd) + longitude - ra
+    return numpy.arcsin(numpy.sin(dec)*numpy.sin(latitude) + numpy.cos(dec)*numpy.cos(latitude)*numpy.cos(hour_angle))
+
+def Gmst(mjd):
+    """Gmst(mjd)
+    Returns the Greenwich mean sidereal time in radians.
+
+    mjd (float, array): Modified Julian Date (UTC).
+    """
+    return (4.894961212823756 + 6.300388098984957*(numpy.asarray(mjd) - 51544.5)) % (2*numpy.pi)
+
+def Mjd_from_datetime(time):
+    """Mjd_from_datetime(time)
+    Returns the Modified Julian Date of a UTC datetime.datetime or
+    datetime.date.
+
+    time (datetime): Time to convert.
+    """
+    if not isinstance(time, datetime.datetime):
+        time = datetime.datetime(time.year, time.month, time.day)
+    delta = time.replace(tzinfo=None) - _datetime_epoch
+    return _mjd_epoch + delta.days + (delta.seconds + delta.microseconds*1e-6)/86400.
+
+def Site_coordinates(observatory):
+    """Site_coordinates(observatory)
+    Returns the latitude and longitude of an observatory in radians.
+
+    observatory (Site, tuple): An observatory instance (from
+        astropysics.obstools.site), or a tuple of (latitude, longitude) in
+        degrees, longitude east positive.
+    """
+    if isinstance(observatory, (tuple, list)):
+        return numpy.radians(observatory[0]), numpy.radians(observatory[1])
+    return observatory.latitude.radians, observatory.longitude.radians
+
+def Visibility_windows(ra, dec, latitude, longitude, mjd, elevation):
+    """Visibility_windows(ra, dec, latitude, longitude, mjd, elevation)
+    Returns the rise, set and transit times (as Modified Julian Dates) of
+    sources above an elevation limit, for the transit occurring during each
+    of the given days. The output arrays have shape (ndays, nsources).
+    Sources that never rise have NaN rise and set times, and those that
+    never set have -inf and +inf respectively.
+
+    ra (array): Right ascension of the sources in radians.
+    dec (array): Declination of the sources in radians.
+    latitude (float): Latitude of the site in radians.
+    longitude (float): Longitude of the site in radians (east positive).
+    mjd (array): Modified Julian Date at 0h UTC of the days.
+    elevation (float): Elevation limit in radians.
+    """
+    ra = numpy.atleast_1d(ra)[numpy.newaxis,:]
+    dec = numpy.atleast_1d(dec)[numpy.newaxis,:]
+    day = numpy.atleast_1d(mjd)[:,numpy.newaxis]
+    # Angular rotation of the sky per solar day
+    rate = 2*numpy.pi*sidereal_rate
+    # First transit after 0h UTC from the sidereal time at the start of the day...
+    transit = day + ((ra - Gmst(day) - longitude) % (2*numpy.pi))/rate
+    # ...refined with a Newton step on the exact sidereal time
+    transit += ((ra - Gmst(transit) - longitude + numpy.pi) % (2*numpy.pi) - numpy.pi)/rate
+    # Hour angle at which the sources cross the elevation limit
+    cos_limit = (numpy.sin(elevation) - numpy.sin(dec)*numpy.sin(latitude)) / (numpy.cos(dec)*numpy.cos(latitude))
+    cos_limit = cos_limit*numpy.ones_like(transit)
+    half_width = numpy.arccos(cos_limit.clip(-1, 1))/rate
+    rise = transit - half_width
+    sets = transit + half_width
+    rise[cos_limit <= -1] = -numpy.inf
+    sets[cos_limit <= -1] = numpy.inf
+    rise[cos_limit >= 1] = numpy.nan
+    sets[cos_limit >= 1] = numpy.nan
+    return rise, sets, transit
+
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+
+
+##### ##### #####
+##### Exceptions
+##### ##### #####
+class LofarCtlError(RuntimeError):
+    """class LofarCtlError(RuntimeError)
+    Base class of the errors raised by LofarCtl. It derives from
+    RuntimeError so that existing error handling keeps working.
+    """
+    pass
+
+
+class InvalidAntennasetError(LofarCtlError):
+    """class InvalidAntennasetError(LofarCtlError)
+    The requested antenna set is not defined in the configuration.
+    """
+    pass
+
+
+class InvalidRcumodeError(LofarCtlError):
+    """class InvalidRcumodeError(LofarCtlError)
+    The requested rcu mode is not defined in the configuration.
+    """
+    pass
+
+
+class InvalidCoordsysError(LofarCtlError):
+    """class InvalidCoordsysError(LofarCtlError)
+    The requested coordinate system is not defined in the configuration.
+    """
+    pass
+
+
+class IncompatibleModeError(LofarCtlError):
+    """class IncompatibleModeError(LofarCtlError)
+    The antenna set and the rcu mode cannot be used together.
+    """
+    pass
+
+
+class InvalidSubbandError(LofarCtlError):
+    """class InvalidSubbandError(LofarCtlError)
+    The subbands fall outside the allowed range or do not match the
+    beamlet IDs.
+    """
+    pass
+
+
+class BeamletLimitError(LofarCtlError):
+    """class BeamletLimitError(LofarCtlError)
+    The number of beamlets requested exceeds the number available.
+    """
+    pass
+
+
+class BeamletConflictError(LofarCtlError):
+    """class BeamletConflictError(LofarCtlError)
+    The beamlet IDs are already reserved by another owner.
+    """
+    pass
+
+
+class InvalidTilingError(LofarCtlError):
+    """class InvalidTilingError(LofarCtlError)
+    The layout requested for a set of tiled beams (number of beams,
+    tiling method, grid or spacing) is invalid.
+    """
+    pass
+
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+import itertools
+import multiprocessing
+import numpy
+from Observation import Observation
+from Station import Station
+
+
+# State kept by each worker process between candidates, so that expensive
+# objects (e.g. the calibrator list) are only loaded once per process
+_worker_state = {}
+
+
+def Build_observation(spec, calibrators=None):
+    """Build_observation(spec, calibrators=None)
+    Returns an Observation built from a specification dictionary.
+
+    spec (dict): Observation specification with the following keys.
+        duration (int): Duration of the integration time in seconds.
+            Default is 120.
+        antennaset (str): Antenna set selection. Default is "HBA_DUAL".
+        rcumode (int): Receiver mode selection. Default is 5.
+        layout (str): Subband allocation strategy passed to
+            Receiver.Tile_passband for the beams that do not specify
+            their subbands. Default is 'equal'.
+        nbeamlets (int): Beamlet budget shared by these beams. Default is
+            the beamlets left after the beams with explicit subbands.
+        beams (list[dict]): List of beams. Each beam has the keys 'ra',
+            'dec' and optionally 'coordsys' and 'inradians', as well as
+            either 'subbands', or 'frequency' and 'nsubbands' (and
+            optionally 'position'), or none of these to use the layout.
+        calibrator (str): Name of a calibrator to observe with the same
+            subbands as the first beam.
+        station (dict): Overrides of the station model (see Station).
+    calibrators (Calibrator): Calibrator instance used to look up the
+        calibrator coordinates. If None, it is loaded when needed.
+    """
+    station = Station(**spec['station']) if 'station' in spec else None
+    obs = Observation(duration=spec.get('duration', 120), antennaset=spec.get('antennaset', "HBA_DUAL"), rcumode=spec.get('rcumode', 5), station=station)
+    beams = spec.get('beams', [])
+    # Beams with explicit subbands are added first, the rest share the remaining beamlets
+    tiled = []
+    for beam in beams:
+        coordsys = beam.get('coordsys', 'J2000')
+        inradians = beam.get('inradians', True)
+        if 'subbands' in beam:
+            obs.Add_beam(beam['subbands'], beam['ra'], beam['dec'], coordsys=coordsys, inradians=inradians)
+        elif 'frequency' in beam:
+            obs.Add_beam_frequency(beam['frequency'], beam['nsubbands'], beam['ra'], beam['dec'], coordsys=coordsys, inradians=inradians, position=beam.get('position', 'center'))
+        else:
+            tiled.append(beam)
+    if len(tiled) > 0:
+        # The calibrator reuses the subbands of the first beam, so it takes a share of the budget
+        nshare = len(tiled) + (1 if spec.get('calibrator') is not None else 0)
+        nbeamlets = spec.get('nbeamlets', obs.max_beamlets - obs.nbeamlets)
+        if spec.get('calibrator') is not None:
+            # The budget is split evenly, as the calibrator share must match the first beam
+            nbeamlets -= nbeamlets % nshare
+        subbands = obs.Receiver.Tile_passband(nshare, nbeamlets=nbeamlets, method=spec.get('layout', 'equal'))
+        for beam, sub in zip(tiled, subbands):
+            obs.Add_beam(sub, beam['ra'], beam['dec'], coordsys=beam.get('coordsys', 'J2000'), inradians=beam.get('inradians', True))
+    if spec.get('calibrator') is not None and obs.nbeams > 0:
+        if calibrators is None:
+            from Calibrator import Calibrator
+            calibrators = Calibrator()
+        i = calibrators.names.index(spec['calibrator'])
+        obs.Add_beam(obs.beams[0].subbands, calibrators.coords[i].ra.radians, calibrators.coords[i].dec.radians, coordsys='J2000')
+    return obs
+
+def Explore(base, grid, score=None, processes=None, chunksize=1):
+    """Explore(base, grid, score=None, processes=None, chunksize=1)
+    Builds and scores the candidate observations obtained by varying the
+    parameters of a base specification over a grid, using a pool of worker
+    processes. This is a generator yielding (score, spec, metrics) for each
+    candidate as soon as it has been evaluated, in order of completion.
+    Candidates that cannot be built have a score of -inf and the error
+    message in metrics['error'].
+
+    base (dict): Base specification, see Build_observation.
+    grid (dict): Parameter grid. Each key is a specification key and each
+        value the list of values to try for it.
+        e.g. {'rcumode': [5, 7], 'layout': ['equal', 'log'],
+            'calibrator': ['3c48', '3c147']}
+    score (function): Function taking an Observation and returning
+        (score, metrics). Must be defined at the module level so that it
+        can be sent to the workers. Default is Score_observation.
+    processes (int): Number of worker processes. If None, the number of
+        cores is used.
+    chunksize (int): Number of candidates sent to a worker at once.
+    """
+    if score is None:
+        score = Score_observation
+    keys = sorted(grid.keys())
+    candidates = ( _Merge(base, zip(keys, values)) for values in itertools.product(*[grid[key] for key in keys]) )
+    pool = multiprocessing.Pool(processes, initializer=_Init_worker, initargs=(score,))
+    try:
+        for result in pool.imap_unordered(_Evaluate, candidates, chunksize):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def Score_observation(obs):
+    """Score_observation(obs)
+    Returns the score of an observation and a dictionary of the metrics it
+    is made of. Higher scores are better.
+        ncommands (int): Number of beamctl commands.
+        coverage (float): Fraction of the passband subbands observed.
+        usage (float): Fraction of the beamlets used.
+    The score is coverage + usage - ncommands/max_beamlets.
+
+    obs (Observation): Observation to score.
+    """
+    ncommands = sum( beam.ncommands for beam in obs.beams )
+    sub_low, sub_high = obs.Receiver.Passband_subbands()
+    if obs.nbeams > 0:
+        subbands = numpy.unique(numpy.concatenate([beam.subbands for beam in obs.beams]))
+        coverage = float(numpy.count_nonzero((subbands >= sub_low) & (subbands <= sub_high))) / (sub_high - sub_low + 1)
+    else:
+        coverage = 0.
+    usage = obs.nbeamlets / float(obs.max_beamlets)
+    metrics = {'ncommands': ncommands, 'coverage': coverage, 'usage': usage}
+    return coverage + usage - ncommands / float(obs.max_beamlets), metrics
+
+def _Evaluate(spec):
+    """_Evaluate(spec)
+    Builds and scores a candidate in a worker process.
+
+    spec (dict): Observation specification.
+    """
+    try:
+        if spec.get('calibrator') is not None and _worker_state.get('calibrators') is None:
+            from Calibrator import Calibrator
+            _worker_state['calibrators'] = Calibrator()
+        obs = Build_observation(spec, calibrators=_worker_state.get('calibrators'))
+        score, metrics = _worker_state['score'](obs)
+    except Exception as inst:
+        return -numpy.inf, spec, {'error': str(inst)}
+    return score, spec, metrics
+
+def _Init_worker(score):
+    """_Init_worker(score)
+    Initializes the state of a worker process.
+
+    score (function): Scoring function.
+    """
+    _worker_state['score'] = score
+    _worker_state['calibrators'] = None
+
+def _Merge(base, items):
+    """_Merge(base, items)
+    Returns a copy of the base specification updated with the items.
+
+    base (dict): Base specification.
+    items (list[tuple]): List of (key, value) pairs.
+    """
+    spec = dict(base)
+    spec.update(items)
+    return spec
+
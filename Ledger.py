@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+import os
+import time
+import fcntl
+import random
+import numpy
+import Config
+from Errors import LofarCtlError, BeamletLimitError, BeamletConflictError
+from Station import Default_station
+
+
+# Record stored for each beamlet ID: the owner (0 if free), the expiry time
+# of the lease (seconds since the epoch) and the subband it observes
+_record = numpy.dtype([('owner', '<i8'), ('expiry', '<f8'), ('subband', '<i8')])
+
+
+##### ##### #####
+##### class Ledger
+##### ##### #####
+class Ledger(object):
+    """class Ledger
+    The Ledger class manages the reservation of the beamlet IDs of a station
+    among several processes building observations at the same time. The
+    reservations are stored in a memory-mapped file and every operation is
+    made atomic with an exclusive lock on that file. Reservations are leases
+    which expire after a given time unless they are renewed.
+    A Ledger can be shared with forked processes (e.g. multiprocessing
+    workers): each process reopens the file, as the lock belongs to the
+    open file and would otherwise be shared with the parent.
+
+    Methods:
+        __init__(path=None, nbeamlets=None)
+        Allocate(nbids, owner, lease=3600., subbands=None, exclude=None)
+        Free_bids()
+        New_owner()
+        Owned(owner)
+        Release(owner, bids=None)
+        Renew(owner, lease=3600.)
+        Reserve(bids, owner, lease=3600., subbands=None)
+
+    Properties:
+        nbeamlets (int): Number of beamlet IDs managed by the ledger.
+        path (str): Path of the memory-mapped ledger file.
+    """
+    def __init__(self, path=None, nbeamlets=None):
+        """__init__(path=None, nbeamlets=None)
+
+        path (str): Path of the ledger file, shared by all the processes.
+            It is created if it does not exist. If None, a file in the
+            cache directory of the configuration is used.
+        nbeamlets (int): Number of beamlet IDs managed by the ledger. If
+            None, the number of beamlets of the station of the
+            configuration is used.
+        """
+        if nbeamlets is None:
+            nbeamlets = Default_station().nbeamlets
+        if path is None:
+            if not os.path.exists(Config.cache_path):
+                os.makedirs(Config.cache_path)
+            path = os.path.join(Config.cache_path, 'beamlets_{0}.ledger'.format(nbeamlets))
+        self._path = path
+        self._nbeamlets = int(nbeamlets)
+        self._fd = None
+        self._Open()
+
+    def __del__(self):
+        try:
+            os.close(self._fd)
+        except Exception:
+            pass
+
+    @property
+    def nbeamlets(self):
+        """nbeamlets (int): Number of beamlet IDs managed by the ledger.
+        """
+        return self._nbeamlets
+
+    @property
+    def path(self):
+        """path (str): Path of the memory-mapped ledger file.
+        """
+        return self._path
+
+    def Allocate(self, nbids, owner, lease=3600., subbands=None, exclude=None):
+        """Allocate(nbids, owner, lease=3600., subbands=None, exclude=None)
+        Atomically reserves the lowest free beamlet IDs and returns them.
+
+        nbids (int): Number of beamlet IDs to reserve.
+        owner (int): Owner of the reservation (see New_owner).
+        lease (float): Duration of the reservation in seconds.
+        subbands (list[int]): Subbands observed by the beamlets, recorded
+            for information.
+        exclude (list[int]): Beamlet IDs that must not be allocated even if
+            they are free in the ledger (e.g. those already used by the
+            owner, whose lease may have expired).
+        """
+        self._Lock()
+        try:
+            now = time.time()
+            free = self._Free(now)
+            if exclude is not None:
+                free[exclude] = False
+            bids = numpy.flatnonzero(free)[:nbids]
+            if bids.size != nbids:
+                raise BeamletLimitError( 'The total number of beamlets requested exceeds the number of free beamlets in the ledger ({0}).'.format(bids.size) )
+            self._Write(bids, owner, now+lease, subbands)
+        finally:
+            self._Unlock()
+        return bids
+
+    def Free_bids(self):
+        """Free_bids()
+        Returns the array of beamlet IDs that are currently not reserved.
+        """
+        self._Lock()
+        try:
+            return numpy.flatnonzero(self._Free(time.time()))
+        finally:
+            self._Unlock()
+
+    def New_owner(self):
+        """New_owner()
+        Returns a new unique owner identifier.
+        """
+        return random.SystemRandom().randint(1, 2**62)
+
+    def Owned(self, owner):
+        """Owned(owner)
+        Returns the array of beamlet IDs currently reserved by an owner.
+
+        owner (int): Owner of the reservation.
+        """
+        self._Lock()
+        try:
+            return numpy.flatnonzero((self._table['owner'] == owner) & (self._table['expiry'] >= time.time()))
+        finally:
+            self._Unlock()
+
+    def Release(self, owner, bids=None):
+        """Release(owner, bids=None)
+        Atomically releases beamlet IDs reserved by an owner. The IDs
+        reserved by other owners are left untouched.
+
+        owner (int): Owner of the reservation.
+        bids (list[int]): Beamlet IDs to release. If None, all the beamlet
+            IDs of the owner are released.
+        """
+        self._Lock()
+        try:
+            mine = self._table['owner'] == owner
+            if bids is not None:
+                selection = numpy.zeros(self._nbeamlets, dtype=bool)
+                selection[bids] = True
+                mine &= selection
+            self._table['owner'][mine] = 0
+            self._table['expiry'][mine] = 0.
+            self._table.flush()
+        finally:
+            self._Unlock()
+        return
+
+    def Renew(self, owner, lease=3600.):
+        """Renew(owner, lease=3600.)
+        Extends the reservations of an owner that have not expired yet.
+
+        owner (int): Owner of the reservation.
+        lease (float): New duration of the reservation in seconds, from now.
+        """
+        self._Lock()
+        try:
+            now = time.time()
+            mine = (self._table['owner'] == owner) & (self._table['expiry'] >= now)
+            self._table['expiry'][mine] = now + lease
+            self._table.flush()
+        finally:
+            self._Unlock()
+        return
+
+    def Reserve(self, bids, owner, lease=3600., subbands=None):
+        """Reserve(bids, owner, lease=3600., subbands=None)
+        Atomically reserves specific beamlet IDs. Either all of them are
+        reserved or none is.
+
+        bids (list[int]): Beamlet IDs to reserve.
+        owner (int): Owner of the reservation.
+        lease (float): Duration of the reservation in seconds.
+        subbands (list[int]): Subbands observed by the beamlets, recorded
+            for information.
+        """
+        bids = numpy.atleast_1d(bids)
+        self._Lock()
+        try:
+            now = time.time()
+            taken = ~(self._Free(now)[bids] | (self._table['owner'][bids] == owner))
+            if taken.any():
+                raise BeamletConflictError( 'The beamlets {0} are already reserved by another owner.'.format(bids[taken].tolist()) )
+            self._Write(bids, owner, now+lease, subbands)
+        finally:
+            self._Unlock()
+        return
+
+    def _Free(self, now):
+        """_Free(now)
+        Returns a boolean array of the beamlet IDs that are free or whose
+        lease has expired. Must be called while holding the lock.
+
+        now (float): Current time in seconds since the epoch.
+        """
+        return (self._table['owner'] == 0) | (self._table['expiry'] < now)
+
+    def _Lock(self):
+        """_Lock()
+        Acquires the exclusive lock on the ledger file. In a forked process,
+        the file is reopened first so that the lock is not shared with the
+        parent process.
+        """
+        if os.getpid() != self._pid:
+            self._Open()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def _Open(self):
+        """_Open()
+        Opens the ledger file and maps it in memory, creating it if needed,
+        for the current process.
+        """
+        if self._fd is not None:
+            # Closing the inherited descriptor does not affect the parent process
+            os.close(self._fd)
+        size = self._nbeamlets*_record.itemsize
+        # The file is opened without truncation so that concurrent creators share it
+        self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o666)
+        self._pid = os.getpid()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            current = os.fstat(self._fd).st_size
+            if current == 0:
+                os.ftruncate(self._fd, size)
+            elif current != size:
+                raise LofarCtlError( "The ledger file ({0}) does not hold {1} beamlets.".format(self._path, self._nbeamlets) )
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._table = numpy.memmap(self._path, dtype=_record, mode='r+', shape=(self._nbeamlets,))
+
+    def _Unlock(self):
+        """_Unlock()
+        Releases the exclusive lock on the ledger file.
+        """
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _Write(self, bids, owner, expiry, subbands):
+        """_Write(bids, owner, expiry, subbands)
+        Writes reservations to the ledger. Must be called while holding
+        the lock.
+
+        bids (array[int]): Beamlet IDs.
+        owner (int): Owner of the reservation.
+        expiry (float): Expiry time of the lease in seconds since the epoch.
+        subbands (list[int]): Subbands observed by the beamlets, or None.
+        """
+        self._table['owner'][bids] = owner
+        self._table['expiry'][bids] = expiry
+        self._table['subband'][bids] = -1 if subbands is None else subbands
+        self._table.flush()
+
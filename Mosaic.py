@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+import numpy
+from Errors import InvalidTilingError
+from Observation import Observation
+
+
+
+##### ##### #####
+##### class Mosaic
+##### ##### #####
+class Mosaic(object):
+    """class Mosaic
+    The Mosaic class generates a set of tiled beams around a field center.
+    The tile centers are laid out on a hexagonal or square grid within a
+    given radius and the beamlet budget of the station is shared among the
+    tiles.
+
+    Methods:
+        __init__(ra, dec, spacing, radius, grid='hexagonal', coordsys='J2000', inradians=True)
+        Make_observation(duration=120, antennaset="HBA_DUAL", rcumode=5,
+            nbeamlets=None, method='equal', station=None)
+
+    Properties:
+        coordsys (str): Coordinate system.
+        dec (float): Declination in radians of the field center (or
+            elevation analogue in other coordinate system).
+        ntiles (int): Number of tiles in the mosaic.
+        ra (float): Right ascension in radians of the field center (or
+            azimuth analogue in other coordinate system).
+        tiles_dec (array[float]): Declination in radians of the tile centers.
+        tiles_ra (array[float]): Right ascension in radians of the tile
+            centers.
+
+        See LofarCtl_config.json for the list of possible coordsys.
+    """
+    def __init__(self, ra, dec, spacing, radius, grid='hexagonal', coordsys='J2000', inradians=True):
+        """__init__(ra, dec, spacing, radius, grid='hexagonal', coordsys='J2000', inradians=True)
+
+        ra (float): RA of the field center.
+        dec (float): Dec of the field center.
+        spacing (float): Angular distance between neighbouring tiles.
+        radius (float): Maximum angular distance of the tile centers from
+            the field center.
+        grid (str): Layout of the tiles.
+            {'hexagonal', 'square'}
+        coordsys (str): Coordinate system to use. If not J2000, the
+            ra and dec parameters are their equivalent in the other system.
+        inradians (bool): If True, the coordinates, spacing and radius are
+            in radians. If False, degrees are assumed.
+        """
+        if not inradians:
+            ra = ra*numpy.pi/180
+            dec = dec*numpy.pi/180
+            spacing = spacing*numpy.pi/180
+            radius = radius*numpy.pi/180
+        if spacing <= 0:
+            raise InvalidTilingError( "The tile spacing must be positive." )
+        self._ra = float(ra)
+        self._dec = float(dec)
+        self._coordsys = coordsys
+        # Offsets of the tiles in the plane tangent to the field center
+        x, y = self._Grid(spacing, radius, grid.lower())
+        self._tiles_ra, self._tiles_dec = self._Deproject(x, y)
+
+    @property
+    def coordsys(self):
+        """coordsys (str): Coordinate system.
+        """
+        return self._coordsys
+
+    @property
+    def dec(self):
+        """dec (float): Declination in radians of the field center (or
+            elevation analogue in other coordinate system).
+        """
+        return self._dec
+
+    @property
+    def ntiles(self):
+        """ntiles (int): Number of tiles in the mosaic.
+        """
+        return self._tiles_ra.size
+
+    @property
+    def ra(self):
+        """ra (float): Right ascension in radians of the field center (or
+            azimuth analogue in other coordinate system).
+        """
+        return self._ra
+
+    @property
+    def tiles_dec(self):
+        """tiles_dec (array[float]): Declination in radians of the tile centers.
+        """
+        return self._tiles_dec
+
+    @property
+    def tiles_ra(self):
+        """tiles_ra (array[float]): Right ascension in radians of the tile
+            centers.
+        """
+        return self._tiles_ra
+
+    def Make_observation(self, duration=120, antennaset="HBA_DUAL", rcumode=5, nbeamlets=None, method='equal', station=None):
+        """Make_observation(duration=120, antennaset="HBA_DUAL", rcumode=5,
+            nbeamlets=None, method='equal', station=None)
+        Returns an Observation containing one beam per tile. The beamlet
+        budget is split evenly among the tiles, the first tiles getting one
+        more subband when it does not divide evenly, and the subbands of
+        each tile are selected with Receiver.Tile_passband. For HBA observations, the
+        analogue beam former of every tile points to the field center.
+
+        duration (int): Duration of the integration time in seconds.
+        antennaset (str): Antenna set selection.
+        rcumode (int): Receiver mode selection.
+            See Table 7 of Station Data Cookbook.
+        nbeamlets (int): Total beamlet budget to share among the tiles.
+            If None, the maximum number of beamlets of the station is used.
+        method (str): Subband allocation strategy passed to
+            Receiver.Tile_passband.
+            {'equal', 'contiguous', 'log'}
+        station (Station): Station model. If None, the station of the
+            configuration is used.
+        """
+        obs = Observation(duration=duration, antennaset=antennaset, rcumode=rcumode, station=station)
+        if nbeamlets is None:
+            nbeamlets = obs.max_beamlets
+        subbands = obs.Receiver.Tile_passband(self.ntiles, nbeamlets=nbeamlets, method=method)
+        if antennaset.upper().find('HBA') != -1:
+            anara, anadec = self._ra, self._dec
+        else:
+            anara, anadec = None, None
+        obs.Add_beams(subbands, self._tiles_ra, self._tiles_dec, coordsys=self._coordsys, anara=anara, anadec=anadec)
+        return obs
+
+    def _Deproject(self, x, y):
+        """_Deproject(x, y)
+        Converts offsets in the plane tangent to the field center into sky
+        coordinates using the inverse gnomonic projection.
+
+        x (array[float]): Offsets along the ra axis (radians).
+        y (array[float]): Offsets along the dec axis (radians).
+        """
+        rho = numpy.hypot(x, y)
+        c = numpy.arctan(rho)
+        sin_c = numpy.sin(c)
+        cos_c = numpy.cos(c)
+        sin_dec0 = numpy.sin(self._dec)
+        cos_dec0 = numpy.cos(self._dec)
+        # The field center (rho = 0) is handled by replacing y*sin(c)/rho with its limit
+        ratio = numpy.where(rho > 0, y*sin_c/numpy.where(rho > 0, rho, 1.), 0.)
+        dec = numpy.arcsin(cos_c*sin_dec0 + ratio*cos_dec0)
+        ra = self._ra + numpy.arctan2(x*sin_c, rho*cos_dec0*cos_c - y*sin_dec0*sin_c)
+        ra = numpy.where(rho > 0, ra, self._ra) % (2*numpy.pi)
+        return ra, dec
+
+    def _Grid(self, spacing, radius, grid):
+        """_Grid(spacing, radius, grid)
+        Returns the tangent plane offsets (x, y) of the tiles lying within
+        the radius, sorted by distance from the field center.
+
+        spacing (float): Angular distance between neighbouring tiles (radians).
+        radius (float): Maximum distance from the field center (radians).
+        grid (str): Layout of the tiles.
+            {'hexagonal', 'square'}
+        """
+        # The tangent plane distance corresponding to the angular radius
+        rmax = numpy.tan(min(radius, numpy.pi/2*0.99))
+        n = int(numpy.ceil(rmax/spacing)) + 1
+        i, j = numpy.meshgrid(numpy.arange(-n, n+1), numpy.arange(-2*n, 2*n+1))
+        if grid == 'hexagonal':
+            x = (i + 0.5*(j%2))*spacing
+            y = j*spacing*numpy.sqrt(3)/2
+        elif grid == 'square':
+            x = i*spacing
+            y = j*spacing
+        else:
+            raise InvalidTilingError( "The grid type ({0}) is invalid.".format(grid) )
+        x = x.ravel()
+        y = y.ravel()
+        r = numpy.hypot(x, y)
+        # A small tolerance avoids dropping tiles lying exactly on the edge
+        inside = r <= rmax*(1+1e-9)
+        order = numpy.argsort(r[inside], kind='mergesort')
+        return x[inside][order], y[inside][order]
+
@@ -2,6 +2,9 @@
 import numpy
 from Beam import Beam
 from Receiver import Receiver
+from Config import Validate
+from Errors import BeamletLimitError, LofarCtlError
+from Station import Default_station
 
 
 
@@ -15,14 +18,28 @@ class Observation(object):
     observation sequence (a string of command sequences) can be returned.
     
     Methods:
-        __init__(antennaset, rcumode)
-        Add_beam(subbands, ra, dec, coordsys='J2000', inradians=True)
+        __init__(duration=120, antennaset="HBA_DUAL", rcumode=5, station=None)
+        Add_beam(subbands, ra, dec, coordsys='J2000', inradians=True,
+            anara=None, anadec=None)
+        Add_beams(subbands, ra, dec, coordsys='J2000', inradians=True,
+            anara=None, anadec=None)
         Add_beam(frequency, nsubbands, ra, dec, coordsys='J2000',
             inradians=True, position='center')
+        Attach_ledger(ledger, lease=3600.)
+        Bid_beam(bid)
+        Detach_ledger()
+        Free_bids()
+        Iter_chunks(encoding=None)
+        Iter_commands()
+        Remove_beam(index)
+        Renew_lease()
+        Subband_in_use(subbands, ra, dec, coordsys='J2000', inradians=True)
+        Write(fileobj, encoding=None)
     
     Properties:
         antennaset (str): Antenna set selection.
         beams (list[Beam]): List of Beam instances.
+        max_beamlets (int): Maximum number of beamlets of the station.
         nbeams (int): Number of beams formed.
         nbeamlets (int): Number of beamlets formed.
         obsctl (str): Telescope control sequence string for each beam
@@ -33,26 +50,43 @@ class Observation(object):
         See LofarCtl_config.json for the list of possible antennaset, coordsys and
         rcumode.
     """
-    def __init__(self, duration=120, antennaset="HBA_DUAL", rcumode=5):
-        """__init__(duration=120, antennaset="HBA_DUAL", rcumode=5)
+    def __init__(self, duration=120, antennaset="HBA_DUAL", rcumode=5, station=None):
+        """__init__(duration=120, antennaset="HBA_DUAL", rcumode=5, station=None)
         
         duration (int): Duration of the integration time in seconds.
         antennaset (str): Antenna set selection.
         rcumode (int): Receiver mode selection.
             See Table 7 of Station Data Cookbook.
+        station (Station): Station model providing the number of beamlets,
+            subbands and receiver units. If None, the station of the
+            configuration is used.
 
         See LofarCtl_config.json for the list of possible antennaset, coordsys and
         rcumode.
         """
+        if station is None:
+            station = Default_station()
+        self._station = station
         self._duration = int(duration)
-        self._antennaset = antennaset
+        # Check the antenna set and receiver mode once for the whole observation
+        self._antennaset = Validate(antennaset, rcumode)
         self._rcumode = rcumode
-        self._max_beamlets = 244
+        self._max_beamlets = station.nbeamlets
+        self._nsubbands = station.nsubbands
         self._nbeamlets = 0
         self._nbeams = 0
-        self._bids = []
         self._beams = []
-        self.Receiver = Receiver(rcumode)
+        # Occupancy maps: index of the beam using each beamlet ID (-1 if free),
+        # and number of beams using each subband for each pointing. The latter
+        # only holds counts; the beams themselves are found from their
+        # beamlet IDs with Bid_beam
+        self._bid_map = numpy.zeros(self._max_beamlets, dtype=int) - 1
+        self._subband_map = {}
+        # Optional ledger shared with other processes building observations
+        self._ledger = None
+        self._owner = None
+        self._lease = None
+        self.Receiver = Receiver(rcumode, station=station)
 
     def __str__(self):
         return self.obsctl
@@ -75,6 +109,12 @@ class Observation(object):
         """
         return self._duration
 
+    @property
+    def max_beamlets(self):
+        """max_beamlets (int): Maximum number of beamlets of the station.
+        """
+        return self._max_beamlets
+
     @property
     def obsctl(self):
         """obsctl (str): Telescope control sequence string for each beamlet
@@ -84,7 +124,7 @@ class Observation(object):
         #cmd = "ps -ea -o args= | grep beamctl | grep -v grep > /data/home/user4/.interrupted_beamctl.txt\n"
         #cmd += "killall beamctl\n"
         #cmd += "kill -9 `ps -ea -o pid,args= | grep 'beamctl' | grep -v grep | awk '{ print $1 }'`\n"
-        cmd += "\n".join( beam.beamctl for beam in self._beams )+"\n"
+        cmd += "\n".join( self.Iter_commands() )+"\n"
         #cmd += "sleep {0}\n".format(self._duration)
         #cmd += "killall beamctl\n"
         #cmd += "kill -9 `ps -ea -o pid,args= | grep 'beamctl' | grep -v grep | awk '{ print $1 }'`\n"
@@ -113,8 +153,8 @@ class Observation(object):
         """
         return self._rcumode
 
-    def Add_beam(self, subbands, ra, dec, coordsys='J2000', inradians=True):
-        """Add_beam(subbands, ra, dec, coordsys='J2000', inradians=True)
+    def Add_beam(self, subbands, ra, dec, coordsys='J2000', inradians=True, anara=None, anadec=None):
+        """Add_beam(subbands, ra, dec, coordsys='J2000', inradians=True, anara=None, anadec=None)
         Adds another beam to the current list of beams using a list of subbands.
         
         subbands (list[int]): List of subbands to add to the beam.
@@ -124,6 +164,10 @@ class Observation(object):
             ra and dec parameters are their equivalent in the other system.
         inradiands (bool): If True, the coordinates are in radians. If False,
             degrees are assumed.
+        anara (float): RA of the HBA analogue beam former. If None, the
+            beam center is used.
+        anadec (float): Dec of the HBA analogue beam former. If None, the
+            beam center is used.
         """
         # Making sure subbands is array type
         subbands = numpy.atleast_1d(subbands)
@@ -133,24 +177,96 @@ class Observation(object):
         if not inradians:
             ra = ra*numpy.pi/180
             dec = dec*numpy.pi/180
+            if anara is not None:
+                anara = anara*numpy.pi/180
+            if anadec is not None:
+                anadec = anadec*numpy.pi/180
         # Getting a list of unique beamlet IDs for the requested subbands
         try:
-            bids = self._Bid_manager(subbands.size)
+            bids = self._Bid_manager(subbands.size, subbands=subbands)
         except RuntimeError as inst:
             print( inst )
             print( 'The beam could not be added.' )
             return
         # Creating the new beam
         try:
-            self._beams.append( Beam(bids, subbands, ra, dec, antennaset=self._antennaset, rcumode=self._rcumode, coordsys=coordsys) )
-            # Updating the count of beams and beamlets
-            self._nbeamlets = self._bids.size
-            self._nbeams += 1
+            beam = Beam(bids, subbands, ra, dec, antennaset=self._antennaset, rcumode=self._rcumode, coordsys=coordsys, anara=anara, anadec=anadec, station=self._station)
+            # Warning about subbands already observed at the same pointing
+            if self.Subband_in_use(subbands, ra, dec, coordsys=coordsys).any():
+                print( 'Warning: some subbands are already observed at this pointing.' )
+            self._Register_beam(beam)
         except Exception as inst:
+            self._Release_bids(bids)
             print( inst )
             print( "A problem occured while adding the beam. No beam added." )
         return
 
+    def Add_beams(self, subbands, ra, dec, coordsys='J2000', inradians=True, anara=None, anadec=None):
+        """Add_beams(subbands, ra, dec, coordsys='J2000', inradians=True, anara=None, anadec=None)
+        Adds several beams at once to the current list of beams. The
+        beamlet IDs of all the beams are allocated in a single call, which
+        makes this faster than repeated calls to Add_beam.
+        
+        subbands (list[array[int]]): List of arrays of subbands, one per
+            beam (e.g. as returned by Receiver.Tile_passband). An array of
+            shape (nbeams, nsubbands) is also accepted.
+        ra (float, array): RA of the beam centers.
+        dec (float, array): Dec of the beam centers.
+        coordsys (str): Coordinate system to use. If not J2000, the
+            ra and dec parameters are their equivalent in the other system.
+        inradiands (bool): If True, the coordinates are in radians. If False,
+            degrees are assumed.
+        anara (float): RA of the HBA analogue beam former. If None, the
+            beam center is used.
+        anadec (float): Dec of the HBA analogue beam former. If None, the
+            beam center is used.
+        """
+        # Making sure subbands is a list of arrays, one per beam
+        subbands = [numpy.atleast_1d(sub) for sub in subbands]
+        nbeams = len(subbands)
+        if nbeams == 0:
+            return
+        # Broadcasting the beam centers to one value per beam
+        ra, dec = numpy.broadcast_arrays(numpy.atleast_1d(ra).astype(float), numpy.atleast_1d(dec).astype(float))
+        if ra.size == 1:
+            ra = numpy.repeat(ra, nbeams)
+            dec = numpy.repeat(dec, nbeams)
+        if ra.size != nbeams:
+            print( 'Number of beam centers ({0}) does not match the number of beams ({1}).'.format(ra.size, nbeams) )
+            print( 'The beams could not be added.' )
+            return
+        # Converting ra/dec to radians if needed
+        if not inradians:
+            ra = ra*numpy.pi/180
+            dec = dec*numpy.pi/180
+            if anara is not None:
+                anara = anara*numpy.pi/180
+            if anadec is not None:
+                anadec = anadec*numpy.pi/180
+        # Check that the subbands fall within the passband
+        all_subbands = numpy.concatenate(subbands)
+        valid_passband = self.Receiver.Check_subband(all_subbands)
+        # Getting a list of unique beamlet IDs for all the requested subbands
+        try:
+            bids = self._Bid_manager(all_subbands.size, subbands=all_subbands)
+        except RuntimeError as inst:
+            print( inst )
+            print( 'The beams could not be added.' )
+            return
+        # Creating the new beams
+        bids = numpy.split(bids, numpy.cumsum([sub.size for sub in subbands])[:-1])
+        for i in range(nbeams):
+            try:
+                beam = Beam(bids[i], subbands[i], ra[i], dec[i], antennaset=self._antennaset, rcumode=self._rcumode, coordsys=coordsys, anara=anara, anadec=anadec, station=self._station)
+                if self.Subband_in_use(subbands[i], ra[i], dec[i], coordsys=coordsys).any():
+                    print( 'Warning: some subbands are already observed at this pointing.' )
+                self._Register_beam(beam)
+            except Exception as inst:
+                self._Release_bids(bids[i])
+                print( inst )
+                print( "A problem occured while adding the beam. No beam added." )
+        return
+
     def Add_beam_frequency(self, frequency, nsubbands, ra, dec, coordsys='J2000', inradians=True, position='center'):
         """Add_beam(frequency, nsubbands, ra, dec, coordsys='J2000', inradians=True, position='center')
         Adds another beam to the current list of beams using a specified
@@ -181,7 +297,7 @@ class Observation(object):
         elif position.upper() == 'upper':
             subbands = numpy.arange(subband0-nsubbands+1, subband0+1)
         else:
-            half = int(nsubbands)/2
+            half = int(nsubbands)//2
             plusone = int(nsubbands%2)
             subbands = numpy.arange(subband0-half, subband0+half+plusone)
         # Safe testing the subbands to make sure that they fit within the allowed range
@@ -189,29 +305,229 @@ class Observation(object):
         sub_max = subbands.max()
         if sub_min < 0:
             subbands -= sub_min
-        elif sub_max > 511:
-            subbands -= sub_max-511
+        elif sub_max > self._nsubbands-1:
+            subbands -= sub_max-self._nsubbands+1
         # Now that we have a list of subbands we can generate the beam
         self.Add_beam(subbands, ra, dec, coordsys=coordsys, inradians=inradians)
         return
 
-    def _Bid_manager(self, nbids):
-        """_Bid_manager(nbids)
+    def Attach_ledger(self, ledger, lease=3600.):
+        """Attach_ledger(ledger, lease=3600.)
+        Attaches the observation to a beamlet ledger shared with other
+        processes building observations for the same station. The beamlet
+        IDs already used by the observation are reserved in the ledger, and
+        the following ones are allocated through it, so that concurrent
+        observations never use the same beamlet IDs.
+        
+        ledger (Ledger): Ledger to attach to. It must manage as many
+            beamlet IDs as the station of the observation has.
+        lease (float): Duration in seconds of the reservations. They can be
+            extended with Renew_lease.
+        """
+        if ledger.nbeamlets != self._max_beamlets:
+            raise LofarCtlError( "The ledger ({0} beamlets) does not match the station of the observation ({1} beamlets).".format(ledger.nbeamlets, self._max_beamlets) )
+        if self._ledger is not None:
+            self.Detach_ledger()
+        owner = ledger.New_owner()
+        used = numpy.flatnonzero(self._bid_map >= 0)
+        if used.size > 0:
+            ledger.Reserve(used, owner, lease=lease)
+        self._ledger = ledger
+        self._owner = owner
+        self._lease = lease
+        return
+
+    def Bid_beam(self, bid):
+        """Bid_beam(bid)
+        Returns the Beam using the beamlet ID, or None if it is free.
+        
+        bid (int): Beamlet ID, between 0 and the maximum number of beamlets
+            of the station minus 1.
+        """
+        if bid < 0 or bid >= self._max_beamlets:
+            raise LofarCtlError( "The beamlet ID ({0}) is out of range (0-{1}).".format(bid, self._max_beamlets-1) )
+        index = self._bid_map[bid]
+        if index < 0:
+            return None
+        return self._beams[index]
+
+    def Detach_ledger(self):
+        """Detach_ledger()
+        Releases the reservations of the observation in the beamlet ledger
+        and detaches from it.
+        """
+        if self._ledger is not None:
+            self._ledger.Release(self._owner)
+        self._ledger = None
+        self._owner = None
+        return
+
+    def Free_bids(self):
+        """Free_bids()
+        Returns the array of beamlet IDs that are not used by any beam.
+        """
+        return numpy.flatnonzero(self._bid_map < 0)
+
+    def Iter_chunks(self, encoding=None):
+        """Iter_chunks(encoding=None)
+        Generator yielding the telescope control sequences of the
+        observation by chunks of one beam, each line being terminated by a
+        newline. This allows to stream large observations without holding
+        the whole sequence in memory.
+        
+        encoding (str): If provided, the chunks are encoded to bytes using
+            this encoding (e.g. 'ascii').
+        """
+        for beam in self._beams:
+            chunk = "\n".join( beam._Render() ) + "\n"
+            if encoding is not None:
+                chunk = chunk.encode(encoding)
+            yield chunk
+
+    def Iter_commands(self):
+        """Iter_commands()
+        Generator yielding the telescope control sequences of the
+        observation one command at a time.
+        """
+        for beam in self._beams:
+            for ctl in beam._Render():
+                yield ctl
+
+    def Remove_beam(self, index):
+        """Remove_beam(index)
+        Removes a beam from the current list of beams and frees its
+        beamlet IDs.
+        
+        index (int): Index of the beam in the list of beams. Negative
+            indices count from the end of the list.
+        """
+        # The index must be non-negative to shift the indices of the following beams
+        index = range(len(self._beams))[index]
+        beam = self._beams.pop(index)
+        # Releasing the beamlet IDs and shifting the indices of the following beams
+        self._bid_map[beam.bids] = -1
+        self._bid_map[self._bid_map > index] -= 1
+        self._Release_bids(beam.bids)
+        pointing = self._Pointing(beam.ra, beam.dec, beam.coordsys)
+        numpy.subtract.at(self._subband_map[pointing], beam.subbands, 1)
+        # Pointings without any beam left are dropped
+        if not self._subband_map[pointing].any():
+            del self._subband_map[pointing]
+        self._nbeamlets -= beam.nbeamlets
+        self._nbeams -= 1
+        return
+
+    def Renew_lease(self):
+        """Renew_lease()
+        Extends the reservations of the observation in the beamlet ledger.
+        """
+        if self._ledger is not None:
+            self._ledger.Renew(self._owner, lease=self._lease)
+        return
+
+    def Subband_in_use(self, subbands, ra, dec, coordsys='J2000', inradians=True):
+        """Subband_in_use(subbands, ra, dec, coordsys='J2000', inradians=True)
+        Returns a boolean array telling whether each subband is already
+        observed by a beam at the given pointing. Subbands outside the
+        allowed range are never in use. Only the occupancy is tracked, the
+        beams using a given beamlet ID are returned by Bid_beam.
+        
+        subbands (list[int]): List of subbands to check.
+        ra (float): RA of the beam center.
+        dec (float): Dec of the beam center.
+        coordsys (str): Coordinate system of the beam center.
+        inradiands (bool): If True, the coordinates are in radians. If False,
+            degrees are assumed.
+        """
+        if not inradians:
+            ra = ra*numpy.pi/180
+            dec = dec*numpy.pi/180
+        subbands = numpy.asarray(subbands)
+        in_use = numpy.zeros(subbands.shape, dtype=bool)
+        occupancy = self._subband_map.get(self._Pointing(ra, dec, coordsys))
+        if occupancy is None:
+            return in_use
+        valid = (subbands >= 0) & (subbands < self._nsubbands)
+        in_use[valid] = occupancy[subbands[valid]] > 0
+        return in_use
+
+    def Write(self, fileobj, encoding=None):
+        """Write(fileobj, encoding=None)
+        Writes the telescope control sequences of the observation to a file
+        object (e.g. a file, pipe or socket file) one beam at a time.
+        Returns the number of commands written.
+        
+        fileobj (file): File object to write to.
+        encoding (str): If provided, the sequences are encoded to bytes
+            using this encoding before writing.
+        """
+        ncommands = 0
+        for beam, chunk in zip(self._beams, self.Iter_chunks(encoding=encoding)):
+            fileobj.write(chunk)
+            ncommands += beam.ncommands
+        return ncommands
+
+    def _Bid_manager(self, nbids, subbands=None):
+        """_Bid_manager(nbids, subbands=None)
         Verifies that the proposed beam to be added respects the basic
         constraints imposed by the telescope. Returns a list of beamlet IDs.
+        The beamlet IDs are only marked as used once the beam is registered.
+        If a ledger is attached, the beamlet IDs are reserved in it.
         
         nbids (int): number of requested beam IDs.
+        subbands (list[int]): subbands of the beamlets, recorded in the
+            ledger.
         
         Note:
             The total number of beamlets must be less than the maximum number
-            of beamlets, which is currently 244.        
+            of beamlets of the station (244 for current stations in 16-bit
+            mode).
         """
-        # Retrieving a list of unique integers between 0 and self._max_beamlets-1
-        new_bids = numpy.lib.arraysetops.setdiff1d(numpy.arange(self._max_beamlets),  self._bids, assume_unique=True)[:nbids]
+        if self._ledger is not None:
+            # Our own beamlet IDs are excluded in case their lease has expired
+            return self._ledger.Allocate(nbids, self._owner, lease=self._lease, subbands=subbands, exclude=numpy.flatnonzero(self._bid_map >= 0))
+        # Retrieving a list of unused integers between 0 and self._max_beamlets-1
+        new_bids = self.Free_bids()[:nbids]
         if new_bids.size != nbids:
-            print( new_bids )
-            raise RuntimeError( 'The total number of beamlets requested exceeds the maximum number permitted ({0}).'.format(self._max_beamlets) )
-        self._bids = numpy.r_[self._bids, new_bids]
+            raise BeamletLimitError( 'The total number of beamlets requested exceeds the maximum number permitted ({0}).'.format(self._max_beamlets) )
         return new_bids
 
+    def _Pointing(self, ra, dec, coordsys):
+        """_Pointing(ra, dec, coordsys)
+        Returns the key identifying a pointing in the subband occupancy map.
+        
+        ra (float): RA of the beam center in radians.
+        dec (float): Dec of the beam center in radians.
+        coordsys (str): Coordinate system of the beam center.
+        """
+        return (float(ra), float(dec), coordsys)
+
+    def _Release_bids(self, bids):
+        """_Release_bids(bids)
+        Releases beamlet IDs in the ledger, if one is attached.
+        
+        bids (list[int]): Beamlet IDs to release.
+        """
+        if self._ledger is not None:
+            self._ledger.Release(self._owner, bids=bids)
+        return
+
+    def _Register_beam(self, beam):
+        """_Register_beam(beam)
+        Appends a beam to the current list of beams and updates the
+        occupancy maps and counters.
+        
+        beam (Beam): Beam to register.
+        """
+        self._bid_map[beam.bids] = len(self._beams)
+        pointing = self._Pointing(beam.ra, beam.dec, beam.coordsys)
+        if pointing not in self._subband_map:
+            self._subband_map[pointing] = numpy.zeros(self._nsubbands, dtype=int)
+        # numpy.add.at handles subbands repeated within the beam
+        numpy.add.at(self._subband_map[pointing], beam.subbands, 1)
+        self._beams.append(beam)
+        self._nbeamlets += beam.nbeamlets
+        self._nbeams += 1
+        return
+
 
@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 import numpy
+from Errors import BeamletLimitError, InvalidTilingError
+from Station import Default_station
 
 
 
@@ -12,66 +14,35 @@ class Receiver(object):
     frequencies.
     
     Methods:
-        __init__(rcumode)
+        __init__(rcumode, station=None)
         Check_subband(subband)
         Frequency_from_subband(subband)
+        Passband_subbands()
         Subband_from_frequency(frequency)
+        Tile_passband(nbeams, nbeamlets=None, method='equal')
     
     Properties:
         band(list[float]): Receiver band [lower, upper] (MHz).
         passband(list[float]): Passband [lower, upper] (MHz).
         width (float): Subband channel width (MHz).
     """
-    def __init__(self, rcumode):
-        """__init__()
+    def __init__(self, rcumode, station=None):
+        """__init__(rcumode, station=None)
         
         rcumode (int): Receiver mode.
             {0, 1, 2, 3, 4, 5, 6, 7}
+        station (Station): Station model providing the table of receiver
+            modes and the number of subbands. If None, the station of the
+            configuration is used.
         """
-        # We select the right clock sampling frequency depending on the rcumode
-        if rcumode == 6:
-            clock = 160.
-        else:
-            clock = 200.
+        if station is None:
+            station = Default_station()
+        self._nsubbands = station.nsubbands
+        self._nbeamlets = station.nbeamlets
+        # We select the clock sampling frequency, receiver band and passband depending on the rcumode
+        clock, self._band, self._passband, self._direction = station.Rcumode(rcumode)
         # Calculating the subband channel width
-        self._width = clock/1024
-        # Determining the receiver band
-        if rcumode == 0:
-            self._band = [0.,0.]
-            self._passband = [0.,0.]
-            self._direction = 1
-        elif rcumode == 1:
-            self._band = [0.,100.]
-            self._passband = [10.,90.]
-            self._direction = 1
-        elif rcumode == 2:
-            self._band = [0.,100.]
-            self._passband = [30.,80.]
-            self._direction = 1
-        elif rcumode == 3:
-            self._band = [0.,100.]
-            self._passband = [10.,80.]
-            self._direction = 1
-        elif rcumode == 4:
-            self._band = [0.,100.]
-            self._passband = [30.,80.]
-            self._direction = 1
-        elif rcumode == 5:
-            #self._band = [200.,100.]
-            self._band = [100.,200.]
-            self._passband = [110.,190.]
-            #self._direction = -1
-            self._direction = 1
-        elif rcumode == 6:
-            self._band = [160.,240.]
-            self._passband = [170.,230.]
-            self._direction = 1
-        elif rcumode == 7:
-            self._band = [200.,300.]
-            self._passband = [210.,270.]
-            self._direction = 1
-        else:
-            raise RuntimeError( "The selected rcumode is invalid." )
+        self._width = clock/(2*self._nsubbands)
 
     @property
     def band(self):
@@ -128,10 +99,22 @@ class Receiver(object):
         """Frequency_from_subband(subband)
         Returns the frequency associated to the subband.
         
-        subband (float, array): subband number (0-511).
-            Values outside (0-511) are clipped to that range.
+        subband (float, array): subband number (0-511 for 512 subbands).
+            Values outside that range are clipped to it.
+        """
+        return numpy.array(subband).clip(0, self._nsubbands-1)*self._width*self._direction + self._band[0]
+
+    def Passband_subbands(self):
+        """Passband_subbands()
+        Returns the lowest and highest subbands falling within the
+        passband.
         """
-        return numpy.array(subband).clip(0, 511)*self._width*self._direction + self._band[0]
+        sub_low, sub_high = numpy.sort(self.Subband_from_frequency(numpy.array(self._passband)))
+        if self.Frequency_from_subband(sub_low) < self._passband[0]:
+            sub_low += 1
+        if self.Frequency_from_subband(sub_high) > self._passband[1]:
+            sub_high -= 1
+        return sub_low, sub_high
 
     def Subband_from_frequency(self, frequency):
         """Subband_from_frequency(frequency)
@@ -142,6 +125,74 @@ class Receiver(object):
             Values outside the receiver band range are clipped to the
             range.
         """
-        return numpy.round(self._direction*(frequency - self._band[0])/self._width).astype(int).clip(0, 511)
+        return numpy.round(self._direction*(frequency - self._band[0])/self._width).astype(int).clip(0, self._nsubbands-1)
 
+    def Tile_passband(self, nbeams, nbeamlets=None, method='equal'):
+        """Tile_passband(nbeams, nbeamlets=None, method='equal')
+        Returns an optimal subband allocation covering the passband for a
+        number of beams sharing a fixed beamlet budget. The output is a
+        list of nbeams arrays of subbands, one per beam, which can be passed
+        directly to Observation.Add_beams. Each beam gets nbeamlets/nbeams
+        subbands, and the remainder of the budget is spread over the first
+        beams, which get one more subband.
+        
+        nbeams (int): Number of beams sharing the beamlet budget.
+        nbeamlets (int): Total beamlet budget. If None, the number of
+            beamlets of the station is used.
+        method (str): Allocation strategy.
+            'equal' spreads the subbands uniformly across the passband.
+            'contiguous' selects the largest block of adjacent subbands
+                centered on the passband.
+            'log' spaces the subbands logarithmically in frequency.
+            {'equal', 'contiguous', 'log'}
+        
+        Note:
+            The number of subbands per beam is capped to the number of
+            subbands available in the passband, in which case part of the
+            budget is left unallocated.
+        """
+        if nbeams < 1:
+            raise InvalidTilingError( "The number of beams must be at least 1." )
+        if nbeamlets is None:
+            nbeamlets = self._nbeamlets
+        sub_low, sub_high = self.Passband_subbands()
+        navail = sub_high - sub_low + 1
+        nsub, nextra = divmod(int(nbeamlets), int(nbeams))
+        if nsub >= navail:
+            nsub, nextra = navail, 0
+        if nsub < 1:
+            raise BeamletLimitError( "The beamlet budget ({0}) is too small for {1} beams.".format(nbeamlets, nbeams) )
+        method = method.lower()
+        subbands = self._Tile_subbands(nsub, sub_low, sub_high, method)
+        if nextra > 0:
+            longer = self._Tile_subbands(nsub+1, sub_low, sub_high, method)
+            return [longer.copy() for i in range(nextra)] + [subbands.copy() for i in range(int(nbeams)-nextra)]
+        return [subbands.copy() for i in range(int(nbeams))]
+
+    def _Tile_subbands(self, nsub, sub_low, sub_high, method):
+        """_Tile_subbands(nsub, sub_low, sub_high, method)
+        Returns the subbands of one beam of Tile_passband.
+        
+        nsub (int): Number of subbands.
+        sub_low (int): Lowest subband of the passband.
+        sub_high (int): Highest subband of the passband.
+        method (str): Allocation strategy, see Tile_passband.
+            {'equal', 'contiguous', 'log'}
+        """
+        navail = sub_high - sub_low + 1
+        index = numpy.arange(nsub)
+        if method == 'contiguous':
+            subbands = sub_low + (navail-nsub)//2 + index
+        elif method == 'equal':
+            subbands = sub_low + numpy.round(numpy.linspace(0, navail-1, nsub)).astype(int)
+        elif method == 'log':
+            freq_low, freq_high = self.Frequency_from_subband(numpy.array([sub_low, sub_high]))
+            frequency = numpy.logspace(numpy.log10(max(freq_low, self._width)), numpy.log10(freq_high), nsub)
+            subbands = self.Subband_from_frequency(frequency)
+            # Rounding crowds the low end onto the same subbands, so we push
+            # duplicates up while keeping the last one within the passband
+            subbands = numpy.minimum(numpy.maximum.accumulate(subbands - index), sub_high-nsub+1) + index
+        else:
+            raise InvalidTilingError( "The tiling method ({0}) is invalid.".format(method) )
+        return subbands
 
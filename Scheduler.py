@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+import numpy
+import Ephemeris
+from Observation import Observation
+
+
+
+##### ##### #####
+##### class Scheduler
+##### ##### #####
+class Scheduler(object):
+    """class Scheduler
+    The Scheduler class fits a list of targets into one or several nights,
+    each target observation being preceded by a calibrator scan, while
+    keeping every source above an elevation limit.
+    The nights are divided in time slots and the elevation of all the
+    targets and calibrators is computed at once for every slot. The targets
+    are then placed in order of priority at the position where their mean
+    elevation is the highest.
+
+    Methods:
+        __init__(observatory, elevation=30., slot=300., calibrators=None)
+        Schedule(targets, nights, calibration=600., antennaset="HBA_DUAL",
+            rcumode=5)
+
+    Properties:
+        elevation (float): Elevation limit in degrees.
+        slot (float): Duration of the time slots in seconds.
+    """
+    def __init__(self, observatory, elevation=30., slot=300., calibrators=None):
+        """__init__(observatory, elevation=30., slot=300., calibrators=None)
+
+        observatory (Site, tuple): An observatory instance (from
+            astropysics.obstools.site), or a tuple of (latitude, longitude)
+            in degrees, longitude east positive.
+        elevation (float): Elevation limit in degrees.
+        slot (float): Duration of the time slots in seconds. The start time
+            and duration of the observations are multiples of it.
+        calibrators (Calibrator): Calibrator instance providing the list of
+            calibrators. If None, the default list is loaded when needed.
+        """
+        self._latitude, self._longitude = Ephemeris.Site_coordinates(observatory)
+        self._elevation = elevation
+        self._slot = float(slot)
+        self._calibrators = calibrators
+
+    @property
+    def elevation(self):
+        """elevation (float): Elevation limit in degrees.
+        """
+        return self._elevation
+
+    @property
+    def slot(self):
+        """slot (float): Duration of the time slots in seconds.
+        """
+        return self._slot
+
+    def Schedule(self, targets, nights, calibration=600., antennaset="HBA_DUAL", rcumode=5):
+        """Schedule(targets, nights, calibration=600., antennaset="HBA_DUAL", rcumode=5)
+        Returns the schedule as a list of (start, duration, name, Observation)
+        sorted by start time, and the list of the names of the targets that
+        could not be scheduled.
+
+        targets (list[dict]): List of targets. Each target has the keys
+            'name', 'ra' and 'dec' (in degrees, J2000), 'priority' (higher
+            is scheduled first) and 'duration' (in seconds). The optional
+            key 'subbands' gives the subbands to observe, otherwise the
+            whole beamlet budget is spread over the passband.
+        nights (list[tuple]): List of (start, end) UTC datetime.datetime of
+            the nights.
+        calibration (float): Duration in seconds of the calibrator scan
+            preceding each target. If 0, no calibrator is observed.
+        antennaset (str): Antenna set selection.
+        rcumode (int): Receiver mode selection.
+            See Table 7 of Station Data Cookbook.
+        """
+        # Time slots of all the nights, with the index of the night they belong to
+        edges = []
+        night_index = []
+        for i, (start, end) in enumerate(nights):
+            mjd_start = Ephemeris.Mjd_from_datetime(start)
+            nslots = int((Ephemeris.Mjd_from_datetime(end) - mjd_start)*86400/self._slot)
+            edges.append(mjd_start + numpy.arange(nslots+1)*self._slot/86400)
+            night_index.append(numpy.zeros(nslots, dtype=int) + i)
+        night_index = numpy.concatenate(night_index)
+        free = numpy.ones(night_index.size, dtype=bool)
+        # Elevation matrices of the targets and calibrators, using the lowest elevation at the slot edges
+        ra = numpy.radians([target['ra'] for target in targets])
+        dec = numpy.radians([target['dec'] for target in targets])
+        target_elevation = self._Slot_elevation(ra, dec, edges)
+        ncal = int(numpy.ceil(calibration/self._slot))
+        if ncal > 0:
+            if self._calibrators is None:
+                from Calibrator import Calibrator
+                self._calibrators = Calibrator()
+            cal_elevation = self._Slot_elevation(self._calibrators.ra, self._calibrators.dec, edges)
+        # Default subbands spreading the whole beamlet budget over the passband
+        default_obs = Observation(antennaset=antennaset, rcumode=rcumode)
+        default_subbands = default_obs.Receiver.Tile_passband(1, nbeamlets=default_obs.max_beamlets)[0]
+        # Placing the targets in order of decreasing priority, shortest first for equal priorities
+        order = sorted(range(len(targets)), key=lambda i: (-targets[i].get('priority', 0), targets[i]['duration']))
+        schedule = []
+        unscheduled = []
+        for i in order:
+            target = targets[i]
+            ntarget = int(numpy.ceil(target['duration']/self._slot))
+            start = self._Best_start(target_elevation[i], free, night_index, ntarget, ncal, cal_elevation if ncal > 0 else None)
+            if start is None:
+                unscheduled.append(target['name'])
+                continue
+            free[start:start+ncal+ntarget] = False
+            subbands = target.get('subbands', default_subbands)
+            if ncal > 0:
+                # The calibrator with the highest mean elevation among those above the limit during the whole scan
+                scan = cal_elevation[:,start:start+ncal]
+                cal = numpy.argmax(numpy.where((scan >= self._elevation).all(axis=1), scan.mean(axis=1), -numpy.inf))
+                obs = Observation(duration=calibration, antennaset=antennaset, rcumode=rcumode)
+                obs.Add_beam(subbands, self._calibrators.ra[cal], self._calibrators.dec[cal])
+                schedule.append( (self._Slot_time(edges, start), calibration, self._calibrators.names[cal], obs) )
+            obs = Observation(duration=target['duration'], antennaset=antennaset, rcumode=rcumode)
+            obs.Add_beam(subbands, ra[i], dec[i])
+            schedule.append( (self._Slot_time(edges, start+ncal), target['duration'], target['name'], obs) )
+        schedule.sort(key=lambda item: item[0])
+        return schedule, unscheduled
+
+    def _Best_start(self, elevation, free, night_index, ntarget, ncal, cal_elevation=None):
+        """_Best_start(elevation, free, night_index, ntarget, ncal, cal_elevation=None)
+        Returns the first slot of the best block made of a calibrator scan
+        followed by the target observation, or None if none fits. The best
+        block is the one maximizing the mean elevation of the target.
+
+        elevation (array[float]): Elevation of the target for each slot.
+        free (array[bool]): Slots not used yet.
+        night_index (array[int]): Index of the night of each slot.
+        ntarget (int): Number of slots of the target observation.
+        ncal (int): Number of slots of the calibrator scan.
+        cal_elevation (array[float]): Elevation of the calibrators for each
+            slot, of shape (ncalibrators, nslots).
+        """
+        nslots = free.size
+        nblock = ncal + ntarget
+        if nblock > nslots or ntarget == 0:
+            return None
+        nstart = nslots - nblock + 1
+        # Target visible and slot free over the whole observation
+        usable = _Window_sum(free & (elevation >= self._elevation), ntarget) == ntarget
+        valid = usable[ncal:ncal+nstart].copy()
+        # Block contained within a single night
+        valid &= night_index[:nstart] == night_index[nblock-1:]
+        if ncal > 0:
+            cal_usable = (_Window_sum(free & (cal_elevation >= self._elevation), ncal) == ncal).any(axis=0)
+            valid &= cal_usable[:nstart]
+        if not valid.any():
+            return None
+        mean_elevation = _Window_sum(elevation, ntarget)[ncal:ncal+nstart]
+        return int(numpy.argmax(numpy.where(valid, mean_elevation, -numpy.inf)))
+
+    def _Slot_elevation(self, ra, dec, edges):
+        """_Slot_elevation(ra, dec, edges)
+        Returns the lowest elevation in degrees of the sources during each
+        slot, as an array of shape (nsources, nslots).
+
+        ra (array[float]): Right ascension of the sources in radians.
+        dec (array[float]): Declination of the sources in radians.
+        edges (list[array]): Modified Julian Dates of the slot edges of each
+            night.
+        """
+        ra = numpy.atleast_1d(ra)[:,numpy.newaxis]
+        dec = numpy.atleast_1d(dec)[:,numpy.newaxis]
+        elevation = []
+        for mjd in edges:
+            elev = numpy.degrees(Ephemeris.Elevation(ra, dec, self._latitude, self._longitude, mjd[numpy.newaxis,:]))
+            elevation.append( numpy.minimum(elev[:,:-1], elev[:,1:]) )
+        return numpy.concatenate(elevation, axis=1)
+
+    def _Slot_time(self, edges, index):
+        """_Slot_time(edges, index)
+        Returns the UTC datetime.datetime of the start of a slot.
+
+        edges (list[array]): Modified Julian Dates of the slot edges of each
+            night.
+        index (int): Index of the slot.
+        """
+        for mjd in edges:
+            if index < mjd.size-1:
+                return Ephemeris.Datetime_from_mjd(mjd[index])
+            index -= mjd.size-1
+        raise IndexError( "The slot index is out of range." )
+
+
+def _Window_sum(values, width):
+    """_Window_sum(values, width)
+    Returns the sums of the values over a moving window along the last axis.
+    The output has (width-1) fewer elements than the input.
+
+    values (array): Values to sum.
+    width (int): Width of the window.
+    """
+    cumsum = numpy.cumsum(values, axis=-1)
+    zeros = numpy.zeros(cumsum.shape[:-1] + (1,), dtype=cumsum.dtype)
+    cumsum = numpy.concatenate([zeros, cumsum], axis=-1)
+    return cumsum[...,width:] - cumsum[...,:-width]
+
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+import Config
+from Errors import InvalidRcumodeError, LofarCtlError
+
+
+# Station built from the configuration, shared by default by all objects
+_default = None
+
+
+def Default_station():
+    """Default_station()
+    Returns the Station defined in the configuration. It is created on the
+    first call and shared afterwards.
+    """
+    global _default
+    if _default is None:
+        _default = Station()
+    return _default
+
+
+##### ##### #####
+##### class Station
+##### ##### #####
+class Station(object):
+    """class Station
+    The Station class holds the hardware limits of a LOFAR station and its
+    table of receiver modes. The values are read from the "station" entry of
+    LofarCtl_config.json and can be overridden at instantiation, e.g. for
+    upgraded stations with more beamlets or other bit modes.
+
+    Methods:
+        __init__(**kwargs)
+        Rcumode(rcumode)
+
+    Properties:
+        bitmode (int): Number of bits per sample. {4, 8, 16}
+        nbeamlets (int): Number of beamlets available in the current bit
+            mode.
+        nrcus (int): Number of receiver units.
+        nsubbands (int): Number of subbands.
+        rcus (str): Receiver units selection of the beamctl commands.
+    """
+    def __init__(self, **kwargs):
+        """__init__(**kwargs)
+
+        Any of the keys of the "station" entry of the configuration can be
+        overridden:
+        nbeamlets (int): Number of beamlets available in 16-bit mode.
+        nrcus (int): Number of receiver units.
+        nsubbands (int): Number of subbands.
+        bitmode (int): Number of bits per sample. {4, 8, 16}
+        rcumodes (dict): Table of the receiver modes. Each key is an rcu
+            mode and each value a dictionary with the 'clock' frequency
+            (MHz), the receiver 'band' and the 'passband' ([lower, upper],
+            MHz).
+        """
+        # The configuration may only override some of the default values
+        station = dict(Config.default_station)
+        station.update(Config.config.get("station", {}))
+        station.update(kwargs)
+        self._bitmode = int(station["bitmode"])
+        if self._bitmode not in (4, 8, 16):
+            raise LofarCtlError( "The bit mode ({0}) is invalid.".format(self._bitmode) )
+        # Fewer bits per sample leave room for proportionally more beamlets
+        self._nbeamlets = int(station["nbeamlets"])*16//self._bitmode
+        self._nrcus = int(station["nrcus"])
+        self._nsubbands = int(station["nsubbands"])
+        self._rcumodes = dict( (int(mode), values) for mode, values in station["rcumodes"].items() )
+
+    @property
+    def bitmode(self):
+        """bitmode (int): Number of bits per sample. {4, 8, 16}
+        """
+        return self._bitmode
+
+    @property
+    def nbeamlets(self):
+        """nbeamlets (int): Number of beamlets available in the current bit
+            mode.
+        """
+        return self._nbeamlets
+
+    @property
+    def nrcus(self):
+        """nrcus (int): Number of receiver units.
+        """
+        return self._nrcus
+
+    @property
+    def nsubbands(self):
+        """nsubbands (int): Number of subbands.
+        """
+        return self._nsubbands
+
+    @property
+    def rcus(self):
+        """rcus (str): Receiver units selection of the beamctl commands.
+        """
+        return "0:{0}".format(self._nrcus-1)
+
+    def Rcumode(self, rcumode):
+        """Rcumode(rcumode)
+        Returns the clock frequency (MHz), the receiver band and the
+        passband ([lower, upper], MHz), and the direction of increasing
+        subbands (1 or -1, optional key 'direction' of the table) of a
+        receiver mode.
+
+        rcumode (int): Receiver mode.
+        """
+        try:
+            values = self._rcumodes[rcumode]
+        except KeyError:
+            raise InvalidRcumodeError( "The selected rcumode is invalid." )
+        return float(values["clock"]), [float(f) for f in values["band"]], [float(f) for f in values["passband"]], int(values.get("direction", 1))
+
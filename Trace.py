@@ -0,0 +1,481 @@
+#!/usr/bin/env python
+import os
+import gzip
+import time
+import types
+import pickle
+import hashlib
+import weakref
+import numpy
+from Ledger import Ledger
+from Observation import Observation
+from Receiver import Receiver
+
+
+# Nesting level of the traced calls; only the calls made by the user (level 0)
+# are recorded, the calls they make internally are replayed implicitly
+_depth = 0
+
+# Arguments that can be pickled but are only meaningful in the recording
+# process (e.g. a Ledger holds an open file descriptor)
+_process_bound = (Ledger,)
+
+
+def Digest(value):
+    """Digest(value)
+    Returns a short digest of a value, used to compare the outputs of the
+    recorded and replayed calls.
+
+    value: Value to digest.
+    """
+    if isinstance(value, numpy.ndarray):
+        data = str(value.dtype).encode() + str(value.shape).encode() + numpy.ascontiguousarray(value).tobytes()
+    elif isinstance(value, bytes):
+        data = value
+    elif isinstance(value, (tuple, list)):
+        data = "".join( Digest(item) for item in value ).encode()
+    elif hasattr(value, '__dict__'):
+        # Objects are only compared by type, their repr depends on their address
+        data = type(value).__name__.encode()
+    else:
+        data = repr(value).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()[:16]
+
+def Print_report(report):
+    """Print_report(report)
+    Prints the report returned by Replay.
+
+    report (dict): Replay report.
+    """
+    print( "{0:<32} {1:>7} {2:>14} {3:>14} {4:>9} {5:>9}".format("call", "count", "recorded (ms)", "replayed (ms)", "ratio", "mismatch") )
+    for name in sorted(report['calls']):
+        stats = report['calls'][name]
+        recorded = 1e3*stats['recorded']/stats['count']
+        replayed = 1e3*stats['replayed']/stats['count']
+        ratio = replayed/recorded if recorded > 0 else numpy.nan
+        print( "{0:<32} {1:>7} {2:>14.4f} {3:>14.4f} {4:>9.3f} {5:>9}".format(name, stats['count'], recorded, replayed, ratio, stats['mismatch']) )
+    print( "obsctl identical: {0}/{1}".format(report['obsctl_identical'], report['obsctl_total']) )
+    if len(report['unreplayable']) > 0:
+        print( "Not replayable: {0}".format(sum(report['unreplayable'].values())) )
+        for name in sorted(report['unreplayable']):
+            print( "    {0}: {1}".format(name, report['unreplayable'][name]) )
+    if len(report['errors']) > 0:
+        print( "Errors: {0}".format(len(report['errors'])) )
+        for error in report['errors']:
+            print( "    {0}".format(error) )
+
+def Record_from_environment():
+    """Record_from_environment()
+    Starts a Recorder writing to the file named by the LOFARCTL_TRACE
+    environment variable, if it is set. The trace is closed when the
+    interpreter exits. Returns the Recorder, or None.
+    Processes started by the recording process (e.g. spawned
+    multiprocessing workers) inherit the variable and write their own
+    trace next to it, see Trace_files.
+    """
+    path = os.environ.get('LOFARCTL_TRACE')
+    if not path:
+        return None
+    owner = os.environ.get('LOFARCTL_TRACE_PID')
+    if owner is not None and owner != str(os.getpid()):
+        path = _Process_path(path, os.getpid())
+    else:
+        os.environ['LOFARCTL_TRACE_PID'] = str(os.getpid())
+    import atexit
+    recorder = Recorder(path)
+    recorder.Start()
+    atexit.register(recorder.Stop)
+    return recorder
+
+def Replay(path):
+    """Replay(path)
+    Re-runs the calls of a trace file, and of the traces written by its
+    worker processes (see Trace_files), against the current code. Returns a
+    report dictionary with, for each call name ('Class.method'), the number
+    of calls, the total recorded and replayed durations and the number of
+    calls whose output differs from the recorded one. The report also gives
+    the number of obsctl outputs that are identical, and the list of calls
+    that raised an error during the replay, and for each call name the
+    number of calls that could not be replayed because their arguments
+    could not be recorded (e.g. file objects).
+
+    path (str): Trace file written by a Recorder.
+    """
+    report = {'calls': {}, 'obsctl_identical': 0, 'obsctl_total': 0, 'errors': [], 'unreplayable': {}}
+    for fln in Trace_files(path):
+        _Replay_file(fln, report)
+    return report
+
+def Trace_files(path):
+    """Trace_files(path)
+    Returns the list of the trace files of a recording: the trace of the
+    recording process followed by those of its worker processes, which are
+    named after the process ID (e.g. trace.gz.12345).
+
+    path (str): Trace file written by a Recorder.
+    """
+    dirname, basename = os.path.split(path)
+    prefix = basename + '.'
+    children = [ fln for fln in os.listdir(dirname or '.') if fln.startswith(prefix) and fln[len(prefix):].isdigit() ]
+    return [path] + [ os.path.join(dirname, fln) for fln in sorted(children, key=lambda fln: int(fln[len(prefix):])) ]
+
+def _Process_path(path, pid):
+    """_Process_path(path, pid)
+    Returns the trace file of a worker process.
+
+    path (str): Trace file of the recording.
+    pid (int): Process ID of the worker.
+    """
+    return "{0}.{1}".format(path, pid)
+
+def _Read_trace(path):
+    """_Read_trace(path)
+    Generator yielding the entries of a trace file. The traces of worker
+    processes may end abruptly, as the workers exit without closing them;
+    the reading stops at the last complete entry.
+
+    path (str): Trace file.
+    """
+    f = gzip.open(path, 'rb')
+    try:
+        while True:
+            try:
+                entry = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                break
+            yield entry
+    finally:
+        f.close()
+
+def _Replay_file(path, report):
+    """_Replay_file(path, report)
+    Re-runs the calls of a single trace file and adds them to a report.
+    The trace identifiers are specific to each file.
+
+    path (str): Trace file.
+    report (dict): Replay report to update.
+    """
+    classes = _Traced_classes()
+    instances = {}
+    # Instances whose creation could not be recorded, their calls are skipped
+    unreplayable = set()
+    for entry in _Read_trace(path):
+        kind = entry[0]
+        if kind == 'attr':
+            kind, trace_id, parent_id, attribute = entry
+            if parent_id in instances:
+                instances[trace_id] = getattr(instances[parent_id], attribute)
+            else:
+                unreplayable.add(trace_id)
+            continue
+        if kind == 'unknown':
+            unreplayable.add(entry[1])
+            continue
+        kind, trace_id, cls_name, name, blob, recorded, digest = entry
+        key = "{0}.{1}".format(cls_name, name)
+        if blob is None or trace_id in unreplayable:
+            if kind == 'new':
+                unreplayable.add(trace_id)
+            report['unreplayable'][key] = report['unreplayable'].get(key, 0) + 1
+            continue
+        args, kwargs = pickle.loads(blob)
+        t0 = time.time()
+        try:
+            if kind == 'new':
+                instances[trace_id] = classes[cls_name](*args, **kwargs)
+                result = None
+            elif kind == 'get':
+                result = getattr(instances[trace_id], name)
+            else:
+                result = getattr(instances[trace_id], name)(*args, **kwargs)
+        except Exception as inst:
+            report['errors'].append( "{0}: {1}".format(key, inst) )
+            continue
+        replayed = time.time() - t0
+        stats = report['calls'].setdefault(key, {'count': 0, 'recorded': 0., 'replayed': 0., 'mismatch': 0})
+        stats['count'] += 1
+        stats['recorded'] += recorded
+        stats['replayed'] += replayed
+        identical = digest is None or Digest(result) == digest
+        if not identical:
+            stats['mismatch'] += 1
+        if key == 'Observation.obsctl':
+            report['obsctl_total'] += 1
+            report['obsctl_identical'] += int(identical)
+    return
+
+def _Serialize(args, kwargs):
+    """_Serialize(args, kwargs)
+    Returns the pickled arguments of a call, or None if they cannot be
+    replayed in another process.
+
+    args (tuple): Positional arguments.
+    kwargs (dict): Keyword arguments.
+    """
+    if any( isinstance(value, _process_bound) for value in list(args)+list(kwargs.values()) ):
+        return None
+    try:
+        return pickle.dumps((args, kwargs), 2)
+    except Exception:
+        return None
+
+def _Traced_classes():
+    """_Traced_classes()
+    Returns a dictionary of the classes whose public calls are traced. The
+    Calibrator class is only included if its dependencies are available.
+    """
+    classes = {'Observation': Observation, 'Receiver': Receiver}
+    try:
+        from Calibrator import Calibrator
+        classes['Calibrator'] = Calibrator
+    except ImportError:
+        pass
+    return classes
+
+
+##### ##### #####
+##### class Recorder
+##### ##### #####
+class Recorder(object):
+    """class Recorder
+    The Recorder class captures every public call made on Observation,
+    Receiver and Calibrator instances (including their creation and the
+    obsctl output), with its arguments, duration and a digest of its
+    output, into a compact gzipped trace file. The trace can be re-run
+    against the current code with Replay. Recording never changes the
+    behaviour of the calls: those whose arguments cannot be replayed in
+    another process (e.g. file objects or a Ledger) are recorded as not
+    replayable.
+    Recording is opt-in: it starts with Start (or when entering a with
+    block) and stops with Stop. It can also be started by setting the
+    LOFARCTL_TRACE environment variable to the trace file name.
+    Forked worker processes (e.g. the pools of Cli and Explorer) record
+    their calls into their own trace file, named after the process ID next
+    to the main one. Every entry is flushed as it is written, since the
+    workers exit without closing their trace.
+
+    Methods:
+        __init__(path)
+        Start()
+        Stop()
+
+    Properties:
+        ncalls (int): Number of calls recorded.
+        path (str): Trace file name.
+    """
+    def __init__(self, path):
+        """__init__(path)
+
+        path (str): Trace file name. It is overwritten.
+        """
+        self._path = path
+        self._file = None
+        # Process writing to self._file
+        self._pid = None
+        self._originals = []
+        self._ncalls = 0
+        self._next_id = 0
+        # Trace identifiers of the instances, specific to this recorder
+        self._ids = weakref.WeakKeyDictionary()
+        # Traced instances, used to find the owner of nested instances such as Observation.Receiver
+        self._instances = weakref.WeakValueDictionary()
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, *args):
+        self.Stop()
+
+    @property
+    def ncalls(self):
+        """ncalls (int): Number of calls recorded.
+        """
+        return self._ncalls
+
+    @property
+    def path(self):
+        """path (str): Trace file name.
+        """
+        return self._path
+
+    def Start(self):
+        """Start()
+        Opens the trace file and starts recording the calls.
+        """
+        if self._file is not None:
+            return
+        # Traces left by the workers of a previous recording are removed
+        for fln in Trace_files(self._path)[1:]:
+            os.remove(fln)
+        self._file = gzip.open(self._path, 'wb')
+        # Nothing may stay buffered, as forked processes would write it again
+        self._file.flush()
+        self._pid = os.getpid()
+        for cls_name, cls in _Traced_classes().items():
+            for name, attribute in list(vars(cls).items()):
+                if name == '__init__':
+                    wrapper = self._Wrap_init(cls_name, attribute)
+                elif name.startswith('_'):
+                    continue
+                elif isinstance(attribute, property):
+                    wrapper = property(self._Wrap_call(cls_name, name, attribute.fget, 'get'), attribute.fset, attribute.fdel, attribute.__doc__) if name == 'obsctl' else None
+                elif callable(attribute):
+                    wrapper = self._Wrap_call(cls_name, name, attribute, 'call')
+                else:
+                    wrapper = None
+                if wrapper is not None:
+                    self._originals.append( (cls, name, attribute) )
+                    setattr(cls, name, wrapper)
+        return
+
+    def Stop(self):
+        """Stop()
+        Stops recording the calls and closes the trace file.
+        """
+        for cls, name, attribute in self._originals:
+            setattr(cls, name, attribute)
+        self._originals = []
+        if self._file is not None:
+            if os.getpid() == self._pid:
+                self._file.close()
+            else:
+                self._Detach()
+            self._file = None
+        return
+
+    def _Check_process(self):
+        """_Check_process()
+        Switches to a trace file of its own when called in a forked worker
+        process, so that the calls made by the workers are recorded too.
+        The instances of the parent process are forgotten, as the workers
+        receive copies of them.
+        """
+        pid = os.getpid()
+        if pid == self._pid:
+            return
+        self._Detach()
+        self._file = gzip.open(_Process_path(self._path, pid), 'wb')
+        self._file.flush()
+        self._pid = pid
+        self._ncalls = 0
+        self._next_id = 0
+        self._ids = weakref.WeakKeyDictionary()
+        self._instances = weakref.WeakValueDictionary()
+        return
+
+    def _Detach(self):
+        """_Detach()
+        Drops the trace file inherited from the parent process without
+        writing to it, as closing it would append to the parent's trace.
+        """
+        self._file.fileobj = None
+        return
+
+    def _Identify(self, obj):
+        """_Identify(obj)
+        Returns the trace identifier of an instance. Instances created
+        internally (e.g. the Receiver of an Observation) are given an
+        identifier and recorded as an attribute of their owner. Instances
+        created before the recording started cannot be recreated, so they
+        are recorded as unknown and their calls are not replayed.
+
+        obj: Traced instance.
+        """
+        trace_id = self._ids.get(obj)
+        if trace_id is None:
+            trace_id = self._New_id(obj)
+            for parent_id, parent in list(self._instances.items()):
+                if parent is obj:
+                    continue
+                for attribute, value in vars(parent).items():
+                    if value is obj:
+                        self._Write( ('attr', trace_id, parent_id, attribute) )
+                        return trace_id
+            self._Write( ('unknown', trace_id) )
+        return trace_id
+
+    def _New_id(self, obj):
+        """_New_id(obj)
+        Assigns a new trace identifier to an instance.
+
+        obj: Traced instance.
+        """
+        trace_id = self._next_id
+        self._next_id += 1
+        self._ids[obj] = trace_id
+        self._instances[trace_id] = obj
+        return trace_id
+
+    def _Wrap_call(self, cls_name, name, function, kind):
+        """_Wrap_call(cls_name, name, function, kind)
+        Returns a wrapper of a method (kind 'call') or property getter
+        (kind 'get') recording its top level calls.
+
+        cls_name (str): Name of the class.
+        name (str): Name of the method or property.
+        function (function): Method or property getter to wrap.
+        kind (str): Kind of entry. {'call', 'get'}
+        """
+        recorder = self
+        def wrapper(obj, *args, **kwargs):
+            global _depth
+            if _depth > 0 or recorder._file is None:
+                return function(obj, *args, **kwargs)
+            recorder._Check_process()
+            # The arguments are serialized before the call, as it may modify them
+            blob = _Serialize(args, kwargs)
+            trace_id = recorder._Identify(obj)
+            _depth += 1
+            t0 = time.time()
+            try:
+                result = function(obj, *args, **kwargs)
+            finally:
+                _depth -= 1
+            duration = time.time() - t0
+            # Generators (e.g. Iter_commands) are not consumed, so their output is not compared
+            digest = None if isinstance(result, types.GeneratorType) else Digest(result)
+            recorder._Write( (kind, trace_id, cls_name, name, blob, duration, digest) )
+            return result
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    def _Wrap_init(self, cls_name, function):
+        """_Wrap_init(cls_name, function)
+        Returns a wrapper of an __init__ method recording the creation of
+        the instances at the top level.
+
+        cls_name (str): Name of the class.
+        function (function): __init__ method to wrap.
+        """
+        recorder = self
+        def wrapper(obj, *args, **kwargs):
+            global _depth
+            if _depth > 0 or recorder._file is None:
+                return function(obj, *args, **kwargs)
+            recorder._Check_process()
+            blob = _Serialize(args, kwargs)
+            _depth += 1
+            t0 = time.time()
+            try:
+                function(obj, *args, **kwargs)
+            finally:
+                _depth -= 1
+            duration = time.time() - t0
+            recorder._Write( ('new', recorder._New_id(obj), cls_name, '__init__', blob, duration, None) )
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    def _Write(self, entry):
+        """_Write(entry)
+        Appends an entry to the trace file.
+
+        entry (tuple): Trace entry.
+        """
+        pickle.dump(entry, self._file, 2)
+        self._file.flush()
+        if entry[0] not in ('attr', 'unknown'):
+            self._ncalls += 1
+
@@ -1,14 +1,33 @@
 __all__ = ["Beam",
            "Beamlet",
            "Calibrator",
+           "Ledger",
+           "Mosaic",
            "Observation",
            "Receiver",
-           "Config"]
+           "Scheduler",
+           "Station",
+           "Config",
+           "Ephemeris",
+           "Errors",
+           "Explorer",
+           "Trace"]
 
 from Beam import Beam
 from Beamlet import BeamletLBA, BeamletHBA
 from Calibrator import Calibrator
+from Ledger import Ledger
+from Mosaic import Mosaic
 from Observation import Observation
 from Receiver import Receiver
+from Scheduler import Scheduler
+from Station import Station
 import Config
+import Ephemeris
+import Errors
+import Explorer
+import Trace
+
+# Opt-in recording of the calls, see Trace.Recorder
+Trace.Record_from_environment()
 
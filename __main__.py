@@ -0,0 +1,4 @@
+import sys
+from LofarCtl import Cli
+
+sys.exit(Cli.main())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""station_scaling.py
+Times the allocation, validation, rendering and removal of beams filling the
+whole beamlet budget for stations with 1, 2 and 4 times the number of
+beamlets of the current stations.
+
+Usage: python station_scaling.py [repeat]
+"""
+import sys
+import time
+import numpy
+from LofarCtl import Observation, Station
+
+
+def Time(function, repeat, setup=None):
+    """Time(function, repeat, setup=None)
+    Returns the best time in seconds of several calls to a function. If
+    provided, the untimed setup function is called before each call and its
+    result passed to the function.
+    """
+    best = numpy.inf
+    for i in range(repeat):
+        args = () if setup is None else (setup(),)
+        t0 = time.time()
+        function(*args)
+        best = min(best, time.time()-t0)
+    return best
+
+def Fill_single(station):
+    """Fill_single(station)
+    Fills the beamlet budget with one beam per beamlet, alternating between
+    subbands so that none of them are merged.
+    """
+    obs = Observation(station=station)
+    sub_low, sub_high = obs.Receiver.Passband_subbands()
+    subbands = sub_low + (numpy.arange(station.nbeamlets)*2) % (sub_high-sub_low)
+    for i, subband in enumerate(subbands):
+        obs.Add_beam([subband], 1.0 + 0.001*(i%10), 0.5)
+    return obs
+
+def Fill_bulk(station):
+    """Fill_bulk(station)
+    Fills the beamlet budget with 16 beams spread over the passband.
+    """
+    obs = Observation(station=station)
+    obs.Add_beams(obs.Receiver.Tile_passband(16), 1.0 + 0.01*numpy.arange(16), 0.5)
+    return obs
+
+def Remove_all(obs):
+    """Remove_all(obs)
+    Removes all the beams of an observation, starting with the first one.
+    """
+    while obs.nbeams > 0:
+        obs.Remove_beam(0)
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print( "{0:>6} {1:>10} {2:>12} {3:>12} {4:>12} {5:>12}".format("factor", "nbeamlets", "single (s)", "bulk (s)", "obsctl (s)", "remove (s)") )
+    for factor in [1, 2, 4]:
+        base = Station()
+        station = Station(nbeamlets=base.nbeamlets*factor)
+        t_single = Time(lambda: Fill_single(station), repeat)
+        t_bulk = Time(lambda: Fill_bulk(station), repeat)
+        t_render = Time(lambda obs: obs.obsctl, repeat, setup=lambda: Fill_single(station))
+        t_remove = Time(Remove_all, repeat, setup=lambda: Fill_single(station))
+        print( "{0:>6} {1:>10} {2:>12.4f} {3:>12.4f} {4:>12.4f} {5:>12.4f}".format(factor, station.nbeamlets, t_single, t_bulk, t_render, t_remove) )
+
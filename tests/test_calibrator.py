@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+import shutil
+import datetime
+import tempfile
+import unittest
+import numpy
+from LofarCtl import Config
+from LofarCtl import Ephemeris
+from LofarCtl.Calibrator import Calibrator
+
+
+class TestVisible(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_path = Config.cache_path
+        Config.cache_path = self.tmpdir
+
+    def tearDown(self):
+        Config.cache_path = self.cache_path
+        shutil.rmtree(self.tmpdir)
+
+    def test_sampled_elevation(self):
+        site = (52.915, 6.870)
+        latitude, longitude = Ephemeris.Site_coordinates(site)
+        calibrators = Calibrator()
+        start = datetime.datetime(2026, 10, 14)
+        for i in range(72):
+            time_start = start + datetime.timedelta(hours=2*i)
+            time_end = time_start + datetime.timedelta(minutes=30)
+            visible = calibrators.Visible(site, time_start, time_end, elevation=30.)
+            mjd = Ephemeris.Mjd_from_datetime(time_start) + numpy.linspace(0., 30./1440, 31)[:,numpy.newaxis]
+            elevation = numpy.degrees(Ephemeris.Elevation(calibrators.ra, calibrators.dec, latitude, longitude, mjd)).min(axis=0)
+            for name, elev in zip(calibrators.names, elevation):
+                # Sources grazing the limit are not decisive
+                if abs(elev - 30.) > 0.2:
+                    self.assertEqual(name in visible, elev > 30., "{0} at {1}".format(name, time_start))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+import unittest
+from LofarCtl.Ledger import Ledger
+
+
+class TestForkedProcesses(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_no_double_allocation(self):
+        # The ledger is opened in the parent and used from forked children,
+        # as done by the multiprocessing workers
+        ledger = Ledger(os.path.join(self.tmpdir, 'beamlets.ledger'), nbeamlets=244)
+        nprocesses = 8
+        nallocations = 20
+        read_fd, write_fd = os.pipe()
+        pids = []
+        for i in range(nprocesses):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    owner = ledger.New_owner()
+                    bids = [ int(ledger.Allocate(1, owner)[0]) for j in range(nallocations) ]
+                    os.write(write_fd, (" ".join(map(str, bids)) + "\n").encode('ascii'))
+                finally:
+                    os._exit(0)
+            pids.append(pid)
+        os.close(write_fd)
+        for pid in pids:
+            os.waitpid(pid, 0)
+        with os.fdopen(read_fd) as f:
+            bids = [ int(bid) for bid in f.read().split() ]
+        self.assertEqual(len(bids), nprocesses*nallocations)
+        self.assertEqual(len(set(bids)), nprocesses*nallocations)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from LofarCtl.Errors import LofarCtlError
+from LofarCtl.Ledger import Ledger
+from LofarCtl.Observation import Observation
+
+
+class TestRemoveBeam(unittest.TestCase):
+    def test_negative_index(self):
+        obs = Observation(rcumode=5)
+        obs.Add_beam([100, 101], 1.0, 0.5)
+        obs.Add_beam([200, 201], 1.1, 0.5)
+        obs.Remove_beam(-1)
+        obs.Add_beam([300, 301], 1.2, 0.5)
+        self.assertEqual(obs.nbeams, 2)
+        # The remaining beam keeps its beamlet IDs and the new one gets other IDs
+        self.assertEqual(list(obs.beams[0].bids), [0, 1])
+        self.assertEqual(list(obs.beams[1].bids), [2, 3])
+        self.assertTrue(obs.Bid_beam(0) is obs.beams[0])
+        self.assertTrue(obs.Bid_beam(2) is obs.beams[1])
+
+    def test_empty_pointing(self):
+        obs = Observation(rcumode=5)
+        obs.Add_beam([100, 101], 1.0, 0.5)
+        obs.Remove_beam(0)
+        self.assertEqual(obs._subband_map, {})
+
+
+class TestBidBeam(unittest.TestCase):
+    def test_out_of_range(self):
+        obs = Observation(rcumode=5)
+        obs.Add_beam([100, 101], 1.0, 0.5)
+        self.assertTrue(obs.Bid_beam(1) is obs.beams[0])
+        self.assertTrue(obs.Bid_beam(2) is None)
+        self.assertRaises(LofarCtlError, obs.Bid_beam, -1)
+        self.assertRaises(LofarCtlError, obs.Bid_beam, obs.max_beamlets)
+
+
+class TestSubbandInUse(unittest.TestCase):
+    def test_out_of_range(self):
+        obs = Observation(rcumode=5)
+        obs.Add_beam([100, 511], 1.0, 0.5)
+        self.assertEqual(list(obs.Subband_in_use([-1, 100, 600], 1.0, 0.5)), [False, True, False])
+        # An invalid beam at an occupied pointing is skipped without using beamlets
+        obs.Add_beam([600], 1.0, 0.5)
+        self.assertEqual(obs.nbeams, 1)
+        self.assertEqual(list(obs.Free_bids()[:2]), [2, 3])
+
+
+class TestLedger(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_expired_lease(self):
+        obs = Observation(rcumode=5)
+        obs.Attach_ledger(Ledger(os.path.join(self.tmpdir, 'beamlets.ledger')), lease=0.01)
+        obs.Add_beam([100, 101], 1.0, 0.5)
+        time.sleep(0.05)
+        # The beamlet IDs of the first beam are free in the ledger but still in use
+        obs.Add_beam([200, 201], 1.1, 0.5)
+        self.assertEqual(list(obs.beams[1].bids), [2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()